@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# ----- ATOMIC WRITES -----
+# files other processes may read at any time (figures, the cached keyword index, the csv exports) are written to a
+# temp file next to them and renamed over them, so a reader never sees half a file and a failed write leaves the old one
+# no matplotlib here, so the headless path (datavis.py --summaries-only) can use it too
+
+# umask of the process, read once here (os.umask can only be read by setting it, which isn't thread safe)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# utility function to write data to path atomically: write a temp file next to it, then rename it over path
+# write(f) writes the content to the open binary file f
+# the file gets the mode open() would give it (mkstemp creates it owner-only)
+def write_atomic(path, write):
+  fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.' + os.path.basename(path), suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      write(f)
+    os.chmod(tmp, 0o666 & ~_UMASK)
+    os.replace(tmp, path)
+  except BaseException:
+    os.unlink(tmp)
+    raise
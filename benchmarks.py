@@ -0,0 +1,242 @@
+import argparse
+import io
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import datavis
+import entities
+import query
+import timeseries
+import validate
+from figures import FigureManager, FigureWriter, rss_bytes
+
+# ----- BENCHMARKS -----
+# python benchmarks.py <name> [options], see --help
+# the batch benchmarks render "reports": every figure in datavis.FIGURES for one partition of the projects,
+# the partitions cycle through the institutions and years in the cube
+
+
+# (name, mask) for each of n partitions of the cube
+def partitions(cube, n):
+  institutions = list(cube.codes['PI Affiliated Organization'][1])
+  years = [int(year) for year in cube.codes['Project Year'][1]]
+  choices = [(None, None)] + [(inst, None) for inst in institutions] + [(None, year) for year in years]
+  for inst, year in itertools.islice(itertools.cycle(choices), n):
+    predicate = query.years(year, year) if year is not None else query.institution(inst) if inst is not None else None
+    name = f'year {year}' if year is not None else inst or 'all projects'
+    yield name, None if predicate is None else cube.mask(predicate)
+
+def load_cube(data_dir):
+  proj_data, prod_data, award_data = datavis.load_data(data_dir)
+  return datavis.build_cube(query.ProjectIndex(proj_data, prod_data=prod_data, award_data=award_data))
+
+
+# render n reports to memory through a FigureManager and print the resident memory as the batch goes,
+# it should level off after the first few reports
+def bench_memory(args):
+  cube = load_cube(args.data_dir)
+  manager = FigureManager(track_memory=args.trace)
+  start = time.perf_counter()
+
+  for i, (_, mask) in enumerate(partitions(cube, args.reports), 1):
+    for name in datavis.FIGURES:
+      manager.save(name, lambda: datavis.make_figure(name, cube, mask), io.BytesIO(), format='png')
+    # the first report loads fonts, caches etc., growth is measured from after it
+    if i == 1:
+      first_rss = rss_bytes()
+    if i % args.every == 0 or i == args.reports:
+      print(f'{i} reports, {time.perf_counter() - start:.1f}s, rss {rss_bytes() / 2**20:.1f} MiB')
+
+  manager.stop()
+  print(f'rss grew {(rss_bytes() - first_rss) / 2**20:.1f} MiB over the {args.reports - 1} reports after the first')
+
+  # largest of each memory stat over the batch, per figure
+  peaks = {}
+  for stat in manager.stats:
+    figure_peaks = peaks.setdefault(stat['figure'], {})
+    for key in ('peak_growth_bytes', 'buffer_bytes', 'python_peak_bytes'):
+      if stat[key] is not None:
+        figure_peaks[key] = max(figure_peaks.get(key, 0), stat[key])
+  for name, figure_peaks in peaks.items():
+    print(f'{name}: ' + ', '.join(f"{key[:-len('_bytes')].replace('_', ' ')} {value / 2**20:.1f} MiB" for key, value in figure_peaks.items()))
+
+
+# write n reports of png files to a temp directory, first with a plain FigureManager (draw, encode, write, one
+# after the other) then with a FigureWriter (encode + write in background threads), and compare the throughput
+def bench_pipeline(args):
+  cube = load_cube(args.data_dir)
+  batch = list(partitions(cube, args.reports))
+
+  # seconds to write the batch with save, finish() waits for the files to be written
+  def run(save, finish=lambda: None):
+    with tempfile.TemporaryDirectory() as out_dir:
+      start = time.perf_counter()
+      for i, (_, mask) in enumerate(batch):
+        for name in datavis.FIGURES:
+          save(name, lambda: datavis.make_figure(name, cube, mask), os.path.join(out_dir, f'{i}_{name}.png'))
+      finish()
+      return time.perf_counter() - start
+
+  # one report first, so fonts and caches are loaded before timing
+  FigureManager().save('warm up', lambda: datavis.make_figure('funding_visualizations', cube), io.BytesIO(), format='png')
+
+  figure_count = len(batch) * len(datavis.FIGURES)
+
+  sequential = run(FigureManager().save)
+  print(f'sequential: {figure_count} figures in {sequential:.1f}s, {figure_count / sequential:.1f} figures/s')
+
+  writer = FigureWriter(workers=args.workers, max_pending=args.max_pending)
+  pipelined = run(writer.save, writer.close)
+  print(f'pipelined ({args.workers} writers, {args.max_pending} pending): {figure_count} figures in {pipelined:.1f}s, '
+        f'{figure_count / pipelined:.1f} figures/s, blocked {writer.blocked_seconds:.1f}s on a full queue')
+  print(f'speed-up: {sequential / pipelined:.2f}x')
+
+
+# time fresh python processes (best of --repeat runs): importing datavis, importing it together with the
+# matplotlib modules it used to import at the top, and a whole datavis.main run with and without --summaries-only
+def bench_startup(args):
+  with tempfile.TemporaryDirectory() as out_dir:
+    run_main = f'import datavis; datavis.main({{}} + ["--data-dir", {args.data_dir!r}, "--fig-dir", {out_dir!r}, "--summary-dir", {out_dir!r}])'
+    cases = {
+      'import datavis': 'import datavis',
+      'import datavis + matplotlib': 'import datavis, matplotlib.pyplot, matplotlib.cm',
+      'summaries only': run_main.format('["--summaries-only"]'),
+      'summaries + figures': run_main.format('[]'),
+    }
+    for name, code in cases.items():
+      # fail loudly if the headless cases pull matplotlib in after all
+      if 'matplotlib' not in name and 'figures' not in name:
+        code += '\nassert not any(m.startswith("matplotlib") for m in sys.modules), "matplotlib was imported"'
+      best = float('inf')
+      for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import sys\n' + code], check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+      print(f'{name}: {best:.2f}s')
+
+
+# resolve n synthetic PI names (variants of n / 4 people: honorifics, 'Last, First', middle initials, typos)
+# and print the time of each stage, the pairs compared against all-pairs, and the pairwise precision / recall
+def bench_entities(args):
+  rng = np.random.default_rng(0)
+  syllables = np.array(['an', 'be', 'ca', 'da', 'el', 'fo', 'gu', 'ha', 'in', 'jo', 'ka', 'li', 'mo', 'na', 'or',
+                        'pe', 'qu', 'ra', 'si', 'to', 'ul', 'va', 'wi', 'xa', 'yo', 'ze'])
+  def words(count, length):
+    return [''.join(parts).title() for parts in rng.choice(syllables, size=(count, length))]
+
+  people = max(args.names // 4, 1)
+  firsts, middles, lasts = np.array(words(people, 2)), np.array(words(people, 1)), np.array(words(people, 4))
+  person = rng.integers(0, people, args.names)
+  first, middle, last = firsts[person], middles[person], lasts[person]
+
+  # how each name is written
+  forms = [
+    lambda f, m, l, t: f'{f} {l}',
+    lambda f, m, l, t: f'Dr. {f} {l}',
+    lambda f, m, l, t: f'{l}, {f}',
+    lambda f, m, l, t: f'{f} {m[0]}. {l}',
+    lambda f, m, l, t: f'{f[:t]}{f[t + 1:]} {l}',
+  ]
+  variant = rng.integers(0, len(forms), args.names)
+  typo = rng.integers(1, 4, args.names)
+  names = np.array([forms[v](f, m, l, t) for v, f, m, l, t in zip(variant, first, middle, last, typo)], dtype=object)
+  series = pd.Series(names)
+
+  normalize, block = entities.KINDS['person']
+  start = time.perf_counter()
+  spellings = series.unique()
+  norm_codes, norms = pd.factorize(np.array([normalize(name) for name in spellings], dtype=object))
+  block_codes, _ = pd.factorize(np.array([block(norm) for norm in norms], dtype=object))
+  normalized = time.perf_counter()
+  a, b = entities.similar_pairs(list(norms), block_codes, entities.THRESHOLDS['person'])
+  compared = time.perf_counter()
+  labels = entities.connected_labels(len(norms), a, b)[norm_codes]
+  clustered = time.perf_counter()
+  table = entities.resolve(series, 'person')
+  resolved = time.perf_counter()
+
+  print(f'{args.names} names, {len(spellings)} spellings, {len(norms)} normalized, {block_codes.max() + 1} blocks')
+  print(f'normalize + block: {normalized - start:.2f}s, compare: {compared - normalized:.2f}s, cluster: {clustered - compared:.2f}s')
+  print(f'resolve (all stages + canonical names): {resolved - clustered:.2f}s')
+  print(f'pairs compared: {entities.block_pair_count(block_codes)} (all pairs: {len(norms) * (len(norms) - 1) // 2})')
+
+  # pairwise precision / recall over the distinct spellings
+  truth = pd.Series(person, index=names).groupby(level=0).first().reindex(spellings).to_numpy()
+  def pairs(*keys):
+    sizes = pd.Series(0, index=pd.MultiIndex.from_arrays(keys)).groupby(level=list(range(len(keys)))).size().to_numpy()
+    return int((sizes * (sizes - 1) // 2).sum())
+  found, true, both = pairs(labels), pairs(truth), pairs(labels, truth)
+  print(f'{len(table)} aliases, {len(np.unique(labels))} entities found ({len(np.unique(truth))} people), '
+        f'precision {both / max(found, 1):.3f}, recall {both / max(true, 1):.3f}')
+
+
+def bench_timeseries(args):
+  rng = np.random.default_rng(0)
+  first = 2025 - args.years
+  months = np.array(validate.MONTHS + [None], dtype=object)[rng.integers(0, 13, args.rows)]
+  years = rng.integers(first, 2025, args.rows).astype(float)
+  years[rng.random(args.rows) < 0.01] = np.nan
+  amounts = rng.integers(1000, 250000, args.rows).astype(float)
+  awards = pd.DataFrame({'Project ID': 'IL', 'Year Awarded': years, 'Month Awarded': months, 'Monetary Benefit of Award': amounts})
+  products = pd.DataFrame({'Project ID': 'IL', 'Year of Publication': years})
+
+  start = time.perf_counter()
+  codes = timeseries.month_periods(awards['Year Awarded'], awards['Month Awarded'])
+  coded = time.perf_counter()
+  offset, totals = timeseries.bin_periods(codes, awards['Monetary Benefit of Award'])
+  rolling = timeseries.rolling_sum(totals, 12)
+  binned = time.perf_counter()
+  trends = datavis.trend_tables(products, awards)
+  built = time.perf_counter()
+
+  # the same monthly totals by parsing every row into a date and grouping on it
+  dates = pd.to_datetime(awards['Year Awarded'].astype('Int64').astype(str) + '-' + awards['Month Awarded'], format='%Y-%B', errors='coerce')
+  grouped = awards['Monetary Benefit of Award'].groupby(dates.dt.to_period('M')).sum()
+  grouped = grouped.reindex(pd.period_range(grouped.index.min(), grouped.index.max(), freq='M'), fill_value=0)
+  parsed = time.perf_counter()
+
+  fig = datavis.plot_trends(trends)
+  fig.canvas.draw()
+  drawn = time.perf_counter()
+
+  print(f'{args.rows} awards over {args.years} years, {len(totals)} months')
+  print(f'period codes: {coded - start:.3f}s, bin + rolling sums: {binned - coded:.3f}s, all trend tables: {built - binned:.3f}s')
+  print(f'parsing dates + groupby: {parsed - built:.3f}s')
+  print(f'trend figure: {drawn - parsed:.2f}s, {len(fig.findobj())} artists')
+  print(f'same monthly totals: {np.allclose(grouped.to_numpy(), totals)}, rolling sums: {np.allclose(grouped.rolling(12, min_periods=1).sum(), rolling)}')
+
+
+BENCHMARKS = {
+  'memory': bench_memory,
+  'pipeline': bench_pipeline,
+  'startup': bench_startup,
+  'entities': bench_entities,
+  'timeseries': bench_timeseries,
+}
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmarks for the datavis pipeline.')
+  parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+  parser.add_argument('--data-dir', default=datavis.DATA_DIR)
+  parser.add_argument('--reports', type=int, default=100, help='number of reports in the batch')
+  parser.add_argument('--every', type=int, default=25, help='print progress every this many reports')
+  parser.add_argument('--trace', action='store_true', help='also trace python allocations for their peak per figure')
+  parser.add_argument('--workers', type=int, default=2, help='writer threads for the pipeline benchmark')
+  parser.add_argument('--max-pending', type=int, default=4, help='queued figures before the pipeline blocks')
+  parser.add_argument('--names', type=int, default=100000, help='synthetic names in the entities benchmark')
+  parser.add_argument('--rows', type=int, default=1000000, help='synthetic awards in the timeseries benchmark')
+  parser.add_argument('--years', type=int, default=50, help='years of monthly data in the timeseries benchmark')
+  parser.add_argument('--repeat', type=int, default=5, help='runs per case in the startup benchmark (the best is shown)')
+  args = parser.parse_args()
+  BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from query import isin_codes
+
+# ----- PROJECT CUBE -----
+# count of projects and sums of numeric columns for every combination of
+# (institution, science priority, funding type, year), built in one pass over proj_data
+#
+# only the non-empty cells are stored (coordinate list + one row of measures per cell),
+# so the cube is never bigger than proj_data no matter how many institutions / years there are
+#
+# the cube answers the same aggregation calls as query.ProjectIndex (group_totals, column_sum, count),
+# and predicates on its dimensions evaluate to masks over its cells, so
+#   build_inst_grps(cube, cube.mask(query.funding_type('104g - AIS')))
+# is a reduction over the cells instead of a scan over the projects
+#
+# roll-up / drill-down to any set of dimensions:
+#   cube.rollup(['PI Affiliated Organization', 'Project Year'], mask)
+
+DIMENSIONS = ['PI Affiliated Organization', 'WRRI Science Priority', 'Funding Type', 'Project Year']
+
+class ProjectCube:
+  # index: query.ProjectIndex over proj_data
+  # sum_columns: numeric columns of proj_data to sum in every cell
+  # mask: optional boolean mask of the projects to include
+  def __init__(self, index, sum_columns, mask=None):
+    self.index = index
+    self.dimensions = list(DIMENSIONS)
+    self.sum_columns = list(sum_columns)
+
+    # (codes, categories) per dimension, the year is factorized here since the index keeps it as a float column
+    dim_codes = [index.codes[col] for col in DIMENSIONS[:-1]]
+    year_codes, year_categories = pd.factorize(index.years, sort=True)
+    dim_codes.append((year_codes, pd.Index(year_categories)))
+
+    # missing values (-1) go in one extra slot at the end of each dimension
+    self.shape = tuple(len(categories) + 1 for _, categories in dim_codes)
+    coords = [np.where(codes < 0, len(categories), codes) for codes, categories in dim_codes]
+    flat = np.ravel_multi_index(coords, self.shape)
+
+    values = np.column_stack([index.proj_data[col].to_numpy(dtype=float) for col in self.sum_columns])
+    values = np.nan_to_num(values)
+    if mask is not None:
+      flat = flat[mask]
+      values = values[mask]
+
+    # the one pass: every project is assigned to its cell and accumulated
+    cells, inverse = np.unique(flat, return_inverse=True)
+    self.counts = np.bincount(inverse, minlength=len(cells)).astype(float)
+
+    # cell of every project of the index, -1 for the projects left out by mask
+    self.project_cells = np.full(index.size, -1, dtype=np.int64)
+    self.project_cells[slice(None) if mask is None else mask] = inverse
+    self._all_projects = mask is None
+    self.sums = np.column_stack([np.bincount(inverse, weights=values[:, i], minlength=len(cells)) for i in range(len(self.sum_columns))])
+
+    # per dimension: the code of every cell (-1 for missing) and the categories the codes refer to
+    self.codes = {}
+    for col, (_, categories), cell_coords in zip(DIMENSIONS, dim_codes, np.unravel_index(cells, self.shape)):
+      self.codes[col] = (np.where(cell_coords == len(categories), -1, cell_coords), categories)
+
+    year_cell_codes, year_categories = self.codes['Project Year']
+    self.years = np.where(year_cell_codes < 0, np.nan, np.asarray(year_categories, dtype=float)[year_cell_codes])
+
+    self._masks = {}
+
+  def __len__(self):
+    return len(self.counts)
+
+  # mask over the projects of the index of a mask over the cells (None for every project of the index),
+  # for the figures that need the projects themselves, e.g. to find their products and awards
+  def project_mask(self, mask=None):
+    if mask is None:
+      return None if self._all_projects else self.project_cells >= 0
+    # one extra slot at the end, so cell -1 (left out) maps to False
+    return np.append(mask, False)[self.project_cells]
+
+  # true if predicate only looks at dimensions of the cube (e.g. not at the focus categories)
+  def can_answer(self, predicate):
+    return predicate.columns <= set(self.dimensions)
+
+  # the (read-only) boolean mask of cells matching predicate
+  def mask(self, predicate):
+    if not self.can_answer(predicate):
+      raise ValueError(f'the cube has no dimension for {sorted(predicate.columns - set(self.dimensions))}')
+    mask = self._masks.get(predicate.key)
+    if mask is None:
+      mask = np.asarray(predicate.evaluate(self), dtype=bool)
+      mask.setflags(write=False)
+      self._masks[predicate.key] = mask
+    return mask
+
+  # mask of cells whose code in column is one of values
+  def isin_mask(self, column, values):
+    codes, categories = self.codes[column]
+    return isin_codes(codes, categories, values)
+
+  def _weights(self, values, mask):
+    return values if mask is None else np.where(mask, values, 0.0)
+
+  def count(self, mask=None):
+    return int(self._weights(self.counts, mask).sum())
+
+  def column_sum(self, column, mask=None):
+    return self._weights(self.sums[:, self.sum_columns.index(column)], mask).sum()
+
+  # same result as ProjectIndex.group_totals, from the cells
+  def group_totals(self, column, mask=None):
+    totals = self.rollup([column], mask)
+    return totals[[column, 'Project Count', 'Funding Amount']]
+
+  # project count and every summed column grouped by the given dimensions, over the cells in mask
+  # rows with a missing value in any of the dimensions are left out, like groupby(dropna=True)
+  def rollup(self, dimensions, mask=None):
+    codes = [self.codes[dim][0] for dim in dimensions]
+    shape = tuple(len(self.codes[dim][1]) for dim in dimensions)
+    keep = np.all([c >= 0 for c in codes], axis=0)
+    if mask is not None:
+      keep &= mask
+
+    flat = np.ravel_multi_index([c[keep] for c in codes], shape)
+    groups, inverse = np.unique(flat, return_inverse=True)
+    counts = np.bincount(inverse, weights=self.counts[keep], minlength=len(groups))
+
+    totals = {}
+    for dim, group_codes in zip(dimensions, np.unravel_index(groups, shape)):
+      totals[dim] = self.codes[dim][1][group_codes]
+    totals['Project Count'] = counts.astype(np.int64)
+    for i, col in enumerate(self.sum_columns):
+      totals[col] = np.bincount(inverse, weights=self.sums[keep, i], minlength=len(groups))
+    return pd.DataFrame(totals)
+
+  # one summed column (or 'Project Count') as a dense array with one axis per dimension,
+  # the last slot of every axis holds the projects missing that dimension
+  def dense(self, column='Project Count'):
+    values = self.counts if column == 'Project Count' else self.sums[:, self.sum_columns.index(column)]
+    cube = np.zeros(self.shape)
+    coords = tuple(np.where(self.codes[dim][0] < 0, len(self.codes[dim][1]), self.codes[dim][0]) for dim in self.dimensions)
+    cube[coords] = values
+    return cube
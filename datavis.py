@@ -1,41 +1,125 @@
+import argparse
+import json
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-import matplotlib.cm as cm
 import numpy as np
 import textwrap
 
+# matplotlib (and figures.py, which imports it) is only imported inside the plot_* functions and main,
+# so the summaries can be computed and written without loading it at all
+from atomic import write_atomic
+from cube import ProjectCube
+from entities import ALIASES_FILE, apply_frames, load_aliases
+from ingest import SHEETS, load_workbooks
+from query import ProjectIndex, keywords
+from rules import apply_rules, load_rules
+from search import dataset_key, load_or_build
+from timeseries import bin_periods, month_periods, period_labels, rolling_sum, year_periods
+from validate import validate
+
+DATA_DIR = 'data'
+FIG_DIR = 'saved_figs'
+SUMMARY_DIR = 'summaries'
+
+# csv files of the projects, products and awards sheets in DATA_DIR
+DATA_FILES = ['projects_data.csv', 'products_data.csv', 'awards_data.csv']
+
+# keyword index of the titles, citations and award descriptions, cached in DATA_DIR (see search.py)
+TEXT_INDEX_FILE = 'text_index.npz'
+
 # utility function to clean currency strings
 def clean_currency(x):
   if isinstance(x, str):
     return float(x.replace('$', '').replace(',', '').strip())
-  
+
   return float(x)
 
 # utility function to put new lines in a string
 def wrap_label(label, width=15):
   return '\n'.join(textwrap.wrap(label, width=width))
 
-xls = pd.ExcelFile('data\\Sample Data.xlsx')
-
-for sheet in xls.sheet_names:
-  df = pd.read_excel('data\\Sample Data.xlsx', sheet_name=sheet)
-  df.to_csv(f'data\\{sheet}.csv', index=False)
-
-proj_data = pd.read_csv('data\\projects_data.csv')
-prod_data = pd.read_csv('data\\products_data.csv')
-award_data = pd.read_csv('data\\awards_data.csv')
-
-
-# clean funding amount column from proj_data
-proj_data['Funding Amount'] = proj_data['Funding Amount'].apply(clean_currency)
-
-# normalize values to all caps in 'Focus Category 1', 'Focus Category 2', 'Focus Category 3' columns from proj_data
-for col in ['Focus Category 1', 'Focus Category 2', 'Focus Category 3']:
-  proj_data[col] = proj_data[col].str.upper().str.strip()
-
-# remove rows with 'inProgress' or 'inReview' in 'Product Stage' column from prod_data
-prod_data = prod_data[~prod_data['Product Stage'].isin(['inProgress', 'inReview'])]
+# utility function to keep the k largest of counts (a Series, e.g. from value_counts) and fold the rest into one
+# "Other" entry, so a bar / pie chart gets at most k + 1 bars / slices no matter how many categories there are
+# the k-th largest count is found with a partial sort (np.partition), only the k entries kept are sorted,
+# largest first, ties in their original order (the same k a stable sort would keep)
+# counts with at most k + 1 entries are returned as they are
+def top_k(counts, k, other='Other'):
+  if len(counts) <= k + 1:
+    return counts
+  values = counts.to_numpy()
+  kth = np.partition(values, len(values) - k)[len(values) - k]
+  above = np.flatnonzero(values > kth)
+  top = np.concatenate([above, np.flatnonzero(values == kth)[:k - len(above)]])
+  top = top[np.lexsort((top, -values[top]))]
+  rest = np.ones(len(values), dtype=bool)
+  rest[top] = False
+  return pd.concat([counts.iloc[top], pd.Series([values[rest].sum()], index=[other])]).rename(counts.name)
+
+# merge the projects, products and awards sheets of every workbook in source (a directory or glob, data_dir if None)
+# into the DATA_FILES csv files in data_dir, see ingest.py
+# returns the (path, error message) of the workbooks that couldn't be read, the others are exported anyway
+# the csv files are written atomically, and only if their content changed (so a run on the same workbooks leaves
+# them untouched), a frame no workbook could provide leaves its csv file as it was
+# raises ValueError (before writing anything) if none of the workbooks can be read
+def export_sheets(data_dir=DATA_DIR, source=None, workers=None):
+  frames, failures = load_workbooks(data_dir if source is None else source, RULES, workers)
+  for name, file_name in zip(SHEETS, DATA_FILES):
+    if name not in frames:
+      continue
+    path = os.path.join(data_dir, file_name)
+    content = frames[name].to_csv(index=False).encode('utf-8')
+    if os.path.exists(path):
+      with open(path, 'rb') as f:
+        if f.read() == content:
+          continue
+    write_atomic(path, lambda f: f.write(content))
+  return failures
+
+# cleaning rules, see rules.py
+RULES = load_rules()
+
+# institutions left out of the institution figures
+EXCLUDED_INSTITUTIONS = RULES['figures']['exclude_institutions']
+
+# product stages of products that aren't finished yet
+EXCLUDED_STAGES = RULES['products']['drop']['Product Stage']
+
+# read the projects, products and awards csv files as they are
+# returns (proj_data, prod_data, award_data)
+def read_data(data_dir=DATA_DIR):
+  proj_data, prod_data, award_data = (pd.read_csv(os.path.join(data_dir, name)) for name in DATA_FILES)
+  return proj_data, prod_data, award_data
+
+# clean the frames from read_data
+# aliases: alias table of PI / organization names (see entities.py), read from ALIASES_FILE if not given
+def clean_data(proj_data, prod_data, award_data, rules=RULES, aliases=None):
+  # clean funding amount column from proj_data, and the award amounts (e.g. '$4,500') from award_data
+  proj_data['Funding Amount'] = proj_data['Funding Amount'].apply(clean_currency)
+  award_data['Monetary Benefit of Award'] = award_data['Monetary Benefit of Award'].apply(clean_currency)
+
+  # canonicalize the category columns (e.g. focus categories to all caps) and drop excluded rows
+  # (e.g. products with 'inProgress' or 'inReview' in 'Product Stage'), see rules.json
+  proj_data = apply_rules(rules, 'projects', proj_data)
+  prod_data = apply_rules(rules, 'products', prod_data)
+  award_data = apply_rules(rules, 'awards', award_data)
+
+  # merge spellings of the same PI / organization found by entities.py (e.g. 'Dr. David Lampert' -> 'David Lampert')
+  frames = apply_frames({'projects': proj_data, 'awards': award_data}, load_aliases() if aliases is None else aliases)
+  proj_data, award_data = frames['projects'], frames['awards']
+
+  # year the project started, taken from the 'Project ID' (e.g. '2020IL216B', 'IL_2021_Lampert')
+  proj_data['Project Year'] = proj_data['Project ID'].str.extract(r'(20\d\d)', expand=False).astype(float)
+
+  return proj_data, prod_data, award_data
+
+# read and clean the projects, products and awards csv files
+def load_data(data_dir=DATA_DIR, aliases_path=ALIASES_FILE):
+  return clean_data(*read_data(data_dir), aliases=load_aliases(aliases_path))
+
+# keyword index of the cleaned frames, loaded from data_dir if it was built from the same csv files and rules
+def load_text_index(data_dir, proj_data, prod_data, award_data):
+  key = dataset_key([os.path.join(data_dir, name) for name in DATA_FILES], json.dumps(RULES, sort_keys=True))
+  return load_or_build(os.path.join(data_dir, TEXT_INDEX_FILE), key, proj_data, prod_data, award_data)
 
 
 # new DF (from proj_data):
@@ -51,48 +135,79 @@ student_cols = [
   'Students Supported by Non-Federal (Matching) Funds'
 ]
 student_types = ['Undergraduate', 'Masters', 'PhD', 'Postdoc', 'Non-Federal']
-student_counts = []
-for col in student_cols:
-  total = proj_data[col].sum()
-  student_counts.append(total)
-stu_data = pd.DataFrame({
-  'Student Type': student_types,
-  'Student Count': student_counts
-})
+
+# cube of project count, funding and student totals per (institution, science priority, funding type, year)
+# mask optionally restricts the projects that go into it
+def build_cube(index, mask=None):
+  return ProjectCube(index, ['Funding Amount'] + student_cols, mask)
+
+# the build_* functions take a ProjectCube (or a ProjectIndex over proj_data) and an optional boolean mask
+# of the cells (or projects) to include
+def build_stu_data(index, mask=None):
+  student_counts = []
+  for col in student_cols:
+    total = index.column_sum(col, mask)
+    student_counts.append(total)
+  return pd.DataFrame({
+    'Student Type': student_types,
+    'Student Count': student_counts
+  })
 
 
 # new DF (from proj_data):
 # group by 'WRRI Science Priority'
 # aggregate to get count of projects and sum of 'Funding Amount' in each priority
 # sort by project count descending
-science_grps = proj_data.groupby('WRRI Science Priority', as_index=False, dropna=True).agg(
-  **{'Project Count': ('Project ID', 'size'), 'Funding Amount': ('Funding Amount', 'sum')}
-).sort_values('Project Count', ascending=False)
+# wrap=False keeps the priority names on one line (for the summary files)
+def build_science_grps(index, mask=None, wrap=True):
+  science_grps = index.group_totals('WRRI Science Priority', mask).sort_values('Project Count', ascending=False)
 
-# change each priority name to add line breaks for better visualization
-science_grps['WRRI Science Priority'] = science_grps['WRRI Science Priority'].apply(wrap_label)
+  # change each priority name to add line breaks for better visualization
+  if wrap:
+    science_grps['WRRI Science Priority'] = science_grps['WRRI Science Priority'].apply(wrap_label)
 
-print(science_grps.to_string())
+  return science_grps
 
 # new DF (from proj_data):
 # group by "PI Affiliated Organization"
 # aggregate to get count of projects and sum of 'Funding Amount' in each institut
 # sort by funding amount ascending
-inst_grps = proj_data.groupby('PI Affiliated Organization', as_index=False, dropna=True).agg(
-  **{'Project Count': ('Project ID', 'size'), 'Funding Amount': ('Funding Amount', 'sum')}
-).sort_values('Funding Amount', ascending=True)
-
-# rename 'PI Afilliated Organization' to 'Institution'
-inst_grps.rename(columns={'PI Affiliated Organization': 'Institution'}, inplace=True)
-
-# remove 'Basil's Harvest' and 'National Great Rivers Research & Education Center' rows
-inst_grps = inst_grps[~inst_grps['Institution'].isin(["Basil's Harvest", "National Great Rivers Research & Education Center"])]
-
-
-# add line breaks to institution for better visualization
-inst_grps['Institution'] = inst_grps['Institution'].apply(wrap_label)
-
-print(inst_grps.to_string())
+# wrap=False keeps the institution names on one line (for the summary files)
+def build_inst_grps(index, mask=None, wrap=True):
+  inst_grps = index.group_totals('PI Affiliated Organization', mask).sort_values('Funding Amount', ascending=True)
+
+  # rename 'PI Afilliated Organization' to 'Institution'
+  inst_grps = inst_grps.rename(columns={'PI Affiliated Organization': 'Institution'})
+
+  # remove 'Basil's Harvest' and 'National Great Rivers Research & Education Center' rows
+  inst_grps = inst_grps[~inst_grps['Institution'].isin(EXCLUDED_INSTITUTIONS)]
+
+
+  # add line breaks to institution for better visualization
+  if wrap:
+    inst_grps['Institution'] = inst_grps['Institution'].apply(wrap_label)
+
+  return inst_grps
+
+# new data (from proj_data):
+# 1. project count per 'Funding Type', sorted descending
+# 2. sum of 'Funding Amount' per 'Funding Type', sorted descending
+# 3. average 'Funding Amount' per 'Funding Type', sorted descending
+# 4. overall totals for the info panel
+def build_funding_data(index, mask=None):
+  funding_grps = index.group_totals('Funding Type', mask).set_index('Funding Type')
+  total_projects = index.count(mask)
+  total_funding = index.column_sum('Funding Amount', mask)
+  return {
+    'funding_type_counts': funding_grps['Project Count'].sort_values(ascending=False),
+    'funding_amounts': funding_grps['Funding Amount'].sort_values(ascending=False),
+    'funding_averages': (funding_grps['Funding Amount'] / funding_grps['Project Count']).sort_values(ascending=False),
+    'funding_info': {
+      'total_projects': total_projects,
+      'total_funding': total_funding,
+      'average_funding': total_funding / total_projects if total_projects else float('nan')
+    }
+  }
 
 
 # # new DF (from proj_data and proj_data 2):
@@ -129,103 +244,6 @@ print(inst_grps.to_string())
 
 # print(inst_compare.to_string())
 
-# ----- INSTITUTION VISUALIZATIONS -----
-# Subplots (from inst_grps):
-# 1. bar chart, 'Institution' vs 'Funding Amount'
-# Additional info to display:
-# 1. the relative lengths of the bars in figure 1
-# Figure arrangement:
-# 1 rows, 2 columns
-# subplot in first column, take up 2/3 of figure space
-# additional info in second column, take up 1/3 of figure space
-
-inst_fig = plt.figure(figsize=(12, 8))
-inst_gs = inst_fig.add_gridspec(1, 2, width_ratios=[2, 1])
-
-# set up section scaling
-min_1 = 0
-max_1 = 32500
-incr_1 = 2500.0
-units_1 = (max_1 - min_1) / incr_1
-
-# min_1 = 0
-# max_1 = 22500
-# incr_1 = 25000.0
-# units_1 = (max_1 - min_1) / incr_1
-
-min_2 = 225000
-max_2 = 325000
-incr_2 = 25000.0
-units_2 = (max_2 - min_2) / incr_2
-
-min_3 = 1350000
-max_3 = 1550000
-incr_3 = 50000.0
-units_3 = (max_3 - min_3) / incr_3
-
-# Subplot 1: Institutions by Funding Provided
-# y label: Funding Amount
-# x label: none
-# arrange institutions in ascending order
-# The largest amount will reach the 3rd section, the second largest amount will reach the 2nd section, and the remaining institutions will all go in the 1st section
-# put amount on top of each bar
-
-# split y axes
-# make each tick increment the same visual length:
-#   bottom has 7 increments (0-35k by 5k), middle has 1 increment (250-300k by 50k),
-#   top has 2 increments (1.3-1.5M by 0.1M) -> height ratios [2, 1, 7]
-inst_left_gs = inst_gs[0].subgridspec(3, 1, height_ratios=[units_3, units_2, units_1], hspace=0.05)
-ax_top = inst_fig.add_subplot(inst_left_gs[0])
-ax_mid = inst_fig.add_subplot(inst_left_gs[1], sharex=ax_top)
-ax_bot = inst_fig.add_subplot(inst_left_gs[2], sharex=ax_top)
-
-# plot bars on each axis
-x = np.arange(len(inst_grps))
-for ax in (ax_top, ax_mid, ax_bot):
-  ax.bar(x, inst_grps['Funding Amount'])
-
-# first section
-# formatting: currency, 1XK
-ax_bot.set_ylim(min_1, max_1)
-ax_bot.set_yticks(np.arange(min_1, max_1 + 1, incr_1))
-ax_bot.yaxis.set_major_formatter(plt.FuncFormatter(lambda v, p: f'${v/1e3:.0f}K'))
-
-
-for index, label in enumerate(ax_bot.yaxis.get_ticklabels()):
-  if index % 2 != 0:
-    label.set_visible(False)
-
-
-# second section
-# range: 250 thousand to 300 thousand
-# tick increments: 50 thousand
-# formatting: currency, 1XXK
-ax_mid.set_ylim(min_2, max_2)
-ax_mid.set_yticks(np.arange(min_2, max_2 + 1, incr_2))
-ax_mid.yaxis.set_major_formatter(plt.FuncFormatter(lambda v, p: f'${v/1e3:.0f}K'))
-
-for index, label in enumerate(ax_mid.yaxis.get_ticklabels()):
-  if index % 2 != 1:
-    label.set_visible(False)
-
-# third section
-# range: 1.3 million to 1.5 million
-# tick increments: 0.1 million
-# formatting: currency, 1.XM
-ax_top.set_ylim(min_3, max_3)
-ax_top.set_yticks(np.arange(min_3, max_3 + 1, incr_3))
-ax_top.yaxis.set_major_formatter(plt.FuncFormatter(lambda v, p: f'${v/1e6:.1f}M'))
-
-for index, label in enumerate(ax_top.yaxis.get_ticklabels()):
-  if index % 2 != 1:
-    label.set_visible(False)
-
-# only show ticks on bottom axis
-ax_bot.set_xticks(x)
-ax_bot.set_xticklabels(inst_grps['Institution'], fontsize=8)
-plt.setp(ax_top.get_xticklabels(), visible=False)
-plt.setp(ax_mid.get_xticklabels(), visible=False)
-
 # put funding amount on top of each bar
 # formatting for values <100K: 1.XK
 # formatting for values >100k and <1M: 1XXK
@@ -239,61 +257,54 @@ def format_funding_label(value):
     return f'${value/1e3:.0f}K'
   return f'${value/1e6:.2f}M'
 
-for i, amount in enumerate(inst_grps['Funding Amount']):
-  if amount <= ax_bot.get_ylim()[1]:
-    ax = ax_bot
-  elif amount <= ax_mid.get_ylim()[1]:
-    ax = ax_mid
-  else:
-    ax = ax_top
-  ylim = ax.get_ylim()
-  y_offset = 0.02 * (ylim[1] - ylim[0])
-  ax.text(i, amount + y_offset, format_funding_label(amount), ha='center', va='bottom', fontsize=10, clip_on=False)
-
-# put project count below each bar
-for i, (count, amount) in enumerate(zip(inst_grps['Project Count'], inst_grps['Funding Amount'])):
-  if amount <= ax_bot.get_ylim()[1]:
-    ax = ax_bot
-  elif amount <= ax_mid.get_ylim()[1]:
-    ax = ax_mid
-  else:
-    ax = ax_top
-  ylim = ax.get_ylim()
-  y_offset = 0.02 * (ylim[1] - ylim[0])
-  ax.text(i, amount - y_offset, f'{count}\nprojects', ha='center', va='top', fontsize=10, color='white', clip_on=False)
-
-# Additional info to display:
-# The relative lengths of the bars in figure 4, with the total height of the chart as "1"
-# strip newline characters from institution names for clarity, list number to 5 decimal places
-TOTAL_UNITS = units_1 + units_2 + units_3  # corresponds to y = 1,500,000
 
-def broken_axis_height_units(value):
-  if value <= max_1:
-    return (value / incr_1)
-  if value <= max_2:
-    # Full bottom segment + middle partial 
-    return units_1 + ((value - min_2) / incr_2)
-  # value in top segment
-  # Full bottom + middle + top partial
-  return units_1 + units_2 + ((value - min_3) / incr_3)
+# ----- INFO PANEL METRICS -----
+# the numbers shown next to the charts, computed as columns so they can be exported without drawing anything
+
+# broken y axes of the institution figures, (min, max, tick increment) of each section from the bottom up
+INSTITUTION_AXIS = [(0, 32500, 2500.0), (225000, 325000, 25000.0), (1350000, 1550000, 50000.0)]
+INSTITUTION_AXIS_ALT = [(0, 325000, 25000.0), (1375000, 1500000, 25000.0)]
+
+# funding amount of a bar of relative length 1 in the science priority figure
+SCIENCE_FUNDING_SCALE = 800000
+
+# number of tick increments in each section of a broken y axis
+def axis_units(sections):
+  return [(top - bottom) / incr for bottom, top, incr in sections]
+
+# height of bars with the given amounts on a broken y axis, with the top of the axis as 1
+# every tick increment has the same visual length, amounts past the top are measured in the last section
+def relative_bar_lengths(amounts, sections):
+  amounts = np.asarray(amounts, dtype=float)
+  bottoms, tops, incrs = (np.array(values) for values in zip(*sections))
+  units = axis_units(sections)
+  # section each bar ends in and the units of the sections below it
+  section = np.minimum(np.searchsorted(tops, amounts, side='left'), len(sections) - 1)
+  below = np.concatenate([[0.0], np.cumsum(units[:-1])])
+  return (below[section] + (amounts - bottoms[section]) / incrs[section]) / sum(units)
+
+# inst_grps (from build_inst_grps) with the 'Relative Length' of each bar on the given broken axis
+def institution_metrics(inst_grps, sections=INSTITUTION_AXIS):
+  return inst_grps.assign(**{'Relative Length': relative_bar_lengths(inst_grps['Funding Amount'], sections)})
+
+# science_grps (from build_science_grps) with the 'Relative Length' of each funding bar and the 'Pie Degrees' of each slice
+def science_metrics(science_grps):
+  relative_lengths = science_grps['Funding Amount'] / SCIENCE_FUNDING_SCALE
+  relative_degrees = (science_grps['Project Count'] / science_grps['Project Count'].sum()) * 360
+  return science_grps.assign(**{'Relative Length': relative_lengths, 'Pie Degrees': relative_degrees})
+
+# totals of stu_data (from build_stu_data)
+def student_totals(stu_data):
+  return {
+    'total_wrra_students': stu_data.loc[stu_data['Student Type'] != 'Non-Federal', 'Student Count'].sum(),
+    'total_students': stu_data['Student Count'].sum(),
+  }
+
+# "<label>: <value>" info panel lines, labels put back on one line
+def info_lines(labels, values, fmt):
+  return list(labels.str.replace('\n', ' ') + ': ' + values.map(fmt.format))
 
-info_text = f"Relative Lengths of Funding Amount Bars ({max_3} = 1.0):\n"
-for inst, amount in zip(inst_grps['Institution'], inst_grps['Funding Amount']):
-  inst_long = inst.replace('\n', ' ')
-  rel_length = broken_axis_height_units(amount) / TOTAL_UNITS
-  info_text += f"{inst_long}: {rel_length:.5f}\n"
-
-info_text += f"Distance between tick marks: {(1 / TOTAL_UNITS):.5f}\nTotal number of tick marks: {TOTAL_UNITS:.0f}"
-
-ax_info = inst_fig.add_subplot(inst_gs[1])
-ax_info.axis('off')
-ax_info.text(0.0, 0.5, info_text, fontsize=10, verticalalignment='center')
-
-
-plt.tight_layout()
-inst_fig.savefig('saved_figs/institution_visualizations.png')
-
-# ----- INSTITUTION VISUALIZATIONS ALT -----
+# ----- INSTITUTION VISUALIZATIONS -----
 # Subplots (from inst_grps):
 # 1. bar chart, 'Institution' vs 'Funding Amount'
 # Additional info to display:
@@ -302,98 +313,216 @@ inst_fig.savefig('saved_figs/institution_visualizations.png')
 # 1 rows, 2 columns
 # subplot in first column, take up 2/3 of figure space
 # additional info in second column, take up 1/3 of figure space
-inst_fig = plt.figure(figsize=(12, 8))
-inst_gs = inst_fig.add_gridspec(1, 2, width_ratios=[2, 1])
-
-# set up section scaling
-min_1 = 0
-max_1 = 325000
-incr_1 = 25000.0
-units_1 = (max_1 - min_1) / incr_1
-
-min_2 = 1375000
-max_2 = 1500000
-incr_2 = 25000.0
-units_2 = (max_2 - min_2) / incr_2
-
-# Subplot 1: Institutions by Funding Provided
-# y label: Funding Amount
-# x label: none
-# arrange institutions in ascending order
-# put amount on top of each bar
-
-# split y axes with matching tick scaling in each section
-inst_left_gs = inst_gs[0].subgridspec(2, 1, height_ratios=[units_2, units_1], hspace=0.05)
-ax_top = inst_fig.add_subplot(inst_left_gs[0])
-ax_bot = inst_fig.add_subplot(inst_left_gs[1], sharex=ax_top)
-
-x = np.arange(len(inst_grps))
-for ax in (ax_top, ax_bot):
-  ax.bar(x, inst_grps['Funding Amount'])
-
-# first section (0 - 500k)
-ax_bot.set_ylim(min_1, max_1)
-ax_bot.set_yticks(np.arange(min_1, max_1 + 1, incr_1))
-ax_bot.yaxis.set_major_formatter(plt.FuncFormatter(lambda v, p: f'${v/1e3:.0f}K'))
-
-for index, label in enumerate(ax_bot.yaxis.get_ticklabels()):
-  if index % 2 != 0:
-    label.set_visible(False)
-
-# second section (1.0M - 1.5M)
-ax_top.set_ylim(min_2, max_2)
-ax_top.set_yticks(np.arange(min_2, max_2 + 1, incr_2))
-ax_top.yaxis.set_major_formatter(plt.FuncFormatter(lambda v, p: f'${v/1e6:.2f}M'))
-
-for index, label in enumerate(ax_top.yaxis.get_ticklabels()):
-  if index % 2 != 1:
-    label.set_visible(False)
-
-# only show ticks on bottom axis
-ax_bot.set_xticks(x)
-ax_bot.set_xticklabels(inst_grps['Institution'], fontsize=8)
-plt.setp(ax_top.get_xticklabels(), visible=False)
-
-# put funding amount on top of each bar
-for i, amount in enumerate(inst_grps['Funding Amount']):
-  if amount <= ax_bot.get_ylim()[1]:
-    ax = ax_bot
-  else:
-    ax = ax_top
-  ylim = ax.get_ylim()
-  y_offset = 0.02 * (ylim[1] - ylim[0])
-  ax.text(i, amount + y_offset, format_funding_label(amount), ha='center', va='bottom', fontsize=8, clip_on=False)
-
+def plot_institutions(inst_grps):
+  from matplotlib.artist import setp
+  from matplotlib.ticker import FuncFormatter
+  from figures import new_figure
+
+  inst_fig = new_figure(figsize=(12, 8))
+  inst_gs = inst_fig.add_gridspec(1, 2, width_ratios=[2, 1])
+
+  # set up section scaling
+  (min_1, max_1, incr_1), (min_2, max_2, incr_2), (min_3, max_3, incr_3) = INSTITUTION_AXIS
+  units_1, units_2, units_3 = axis_units(INSTITUTION_AXIS)
+
+  # Subplot 1: Institutions by Funding Provided
+  # y label: Funding Amount
+  # x label: none
+  # arrange institutions in ascending order
+  # The largest amount will reach the 3rd section, the second largest amount will reach the 2nd section, and the remaining institutions will all go in the 1st section
+  # put amount on top of each bar
+
+  # split y axes
+  # make each tick increment the same visual length:
+  #   bottom has 7 increments (0-35k by 5k), middle has 1 increment (250-300k by 50k),
+  #   top has 2 increments (1.3-1.5M by 0.1M) -> height ratios [2, 1, 7]
+  inst_left_gs = inst_gs[0].subgridspec(3, 1, height_ratios=[units_3, units_2, units_1], hspace=0.05)
+  ax_top = inst_fig.add_subplot(inst_left_gs[0])
+  ax_mid = inst_fig.add_subplot(inst_left_gs[1], sharex=ax_top)
+  ax_bot = inst_fig.add_subplot(inst_left_gs[2], sharex=ax_top)
+
+  # plot bars on each axis
+  x = np.arange(len(inst_grps))
+  for ax in (ax_top, ax_mid, ax_bot):
+    ax.bar(x, inst_grps['Funding Amount'])
+
+  # first section
+  # formatting: currency, 1XK
+  ax_bot.set_ylim(min_1, max_1)
+  ax_bot.set_yticks(np.arange(min_1, max_1 + 1, incr_1))
+  ax_bot.yaxis.set_major_formatter(FuncFormatter(lambda v, p: f'${v/1e3:.0f}K'))
+
+
+  for index, label in enumerate(ax_bot.yaxis.get_ticklabels()):
+    if index % 2 != 0:
+      label.set_visible(False)
+
+
+  # second section
+  # range: 250 thousand to 300 thousand
+  # tick increments: 50 thousand
+  # formatting: currency, 1XXK
+  ax_mid.set_ylim(min_2, max_2)
+  ax_mid.set_yticks(np.arange(min_2, max_2 + 1, incr_2))
+  ax_mid.yaxis.set_major_formatter(FuncFormatter(lambda v, p: f'${v/1e3:.0f}K'))
+
+  for index, label in enumerate(ax_mid.yaxis.get_ticklabels()):
+    if index % 2 != 1:
+      label.set_visible(False)
+
+  # third section
+  # range: 1.3 million to 1.5 million
+  # tick increments: 0.1 million
+  # formatting: currency, 1.XM
+  ax_top.set_ylim(min_3, max_3)
+  ax_top.set_yticks(np.arange(min_3, max_3 + 1, incr_3))
+  ax_top.yaxis.set_major_formatter(FuncFormatter(lambda v, p: f'${v/1e6:.1f}M'))
+
+  for index, label in enumerate(ax_top.yaxis.get_ticklabels()):
+    if index % 2 != 1:
+      label.set_visible(False)
+
+  # only show ticks on bottom axis
+  ax_bot.set_xticks(x)
+  ax_bot.set_xticklabels(inst_grps['Institution'], fontsize=8)
+  setp(ax_top.get_xticklabels(), visible=False)
+  setp(ax_mid.get_xticklabels(), visible=False)
+
+  for i, amount in enumerate(inst_grps['Funding Amount']):
+    if amount <= ax_bot.get_ylim()[1]:
+      ax = ax_bot
+    elif amount <= ax_mid.get_ylim()[1]:
+      ax = ax_mid
+    else:
+      ax = ax_top
+    ylim = ax.get_ylim()
+    y_offset = 0.02 * (ylim[1] - ylim[0])
+    ax.text(i, amount + y_offset, format_funding_label(amount), ha='center', va='bottom', fontsize=10, clip_on=False)
+
+  # put project count below each bar
+  for i, (count, amount) in enumerate(zip(inst_grps['Project Count'], inst_grps['Funding Amount'])):
+    if amount <= ax_bot.get_ylim()[1]:
+      ax = ax_bot
+    elif amount <= ax_mid.get_ylim()[1]:
+      ax = ax_mid
+    else:
+      ax = ax_top
+    ylim = ax.get_ylim()
+    y_offset = 0.02 * (ylim[1] - ylim[0])
+    ax.text(i, amount - y_offset, f'{count}\nprojects', ha='center', va='top', fontsize=10, color='white', clip_on=False)
+
+  # Additional info to display:
+  # The relative lengths of the bars in figure 4, with the total height of the chart as "1"
+  # strip newline characters from institution names for clarity, list number to 5 decimal places
+  TOTAL_UNITS = units_1 + units_2 + units_3  # corresponds to y = 1,500,000
+
+  inst_grps = institution_metrics(inst_grps, INSTITUTION_AXIS)
+  info_text = '\n'.join([
+    f"Relative Lengths of Funding Amount Bars ({max_3} = 1.0):",
+    *info_lines(inst_grps['Institution'], inst_grps['Relative Length'], '{:.5f}'),
+    f"Distance between tick marks: {(1 / TOTAL_UNITS):.5f}\nTotal number of tick marks: {TOTAL_UNITS:.0f}",
+  ])
+
+  ax_info = inst_fig.add_subplot(inst_gs[1])
+  ax_info.axis('off')
+  ax_info.text(0.0, 0.5, info_text, fontsize=10, verticalalignment='center')
+
+
+  inst_fig.tight_layout()
+  return inst_fig
 
+# ----- INSTITUTION VISUALIZATIONS ALT -----
+# Subplots (from inst_grps):
+# 1. bar chart, 'Institution' vs 'Funding Amount'
 # Additional info to display:
-# The relative lengths of the bars in figure 4, with the total height of the chart as "1"
-# strip newline characters from institution names for clarity, list number to 5 decimal places
-TOTAL_UNITS = units_1 + units_2  # corresponds to y = 1,500,000 with split scaling
-
-def broken_axis_height_units_alt(value):
-  if value <= max_1:
-    return value / incr_1
-  # value in top segment
-  return units_1 + ((value - min_2) / incr_2)
-
-info_text = f"Relative Lengths of Funding Amount Bars ({max_2} = 1.0):\n"
-for inst, amount in zip(inst_grps['Institution'], inst_grps['Funding Amount']):
-  inst_long = inst.replace('\n', ' ')
-  rel_length = broken_axis_height_units_alt(amount) / TOTAL_UNITS
-  info_text += f"{inst_long}: {rel_length:.5f}\n"
-
-info_text += f"Distance between tick marks: {(1 / TOTAL_UNITS):.5f}\nTotal number of tick marks: {TOTAL_UNITS:.0f}"
-
-ax_info = inst_fig.add_subplot(inst_gs[1])
-ax_info.axis('off')
-ax_info.text(0.0, 0.5, info_text, fontsize=10, verticalalignment='center')
-
-plt.tight_layout()
-inst_fig.savefig('saved_figs/institution_visualizations_alt.png')
+# 1. the relative lengths of the bars in figure 1
+# Figure arrangement:
+# 1 rows, 2 columns
+# subplot in first column, take up 2/3 of figure space
+# additional info in second column, take up 1/3 of figure space
+def plot_institutions_alt(inst_grps):
+  from matplotlib.artist import setp
+  from matplotlib.ticker import FuncFormatter
+  from figures import new_figure
+
+  inst_fig = new_figure(figsize=(12, 8))
+  inst_gs = inst_fig.add_gridspec(1, 2, width_ratios=[2, 1])
+
+  # set up section scaling
+  (min_1, max_1, incr_1), (min_2, max_2, incr_2) = INSTITUTION_AXIS_ALT
+  units_1, units_2 = axis_units(INSTITUTION_AXIS_ALT)
+
+  # Subplot 1: Institutions by Funding Provided
+  # y label: Funding Amount
+  # x label: none
+  # arrange institutions in ascending order
+  # put amount on top of each bar
+
+  # split y axes with matching tick scaling in each section
+  inst_left_gs = inst_gs[0].subgridspec(2, 1, height_ratios=[units_2, units_1], hspace=0.05)
+  ax_top = inst_fig.add_subplot(inst_left_gs[0])
+  ax_bot = inst_fig.add_subplot(inst_left_gs[1], sharex=ax_top)
+
+  x = np.arange(len(inst_grps))
+  for ax in (ax_top, ax_bot):
+    ax.bar(x, inst_grps['Funding Amount'])
+
+  # first section (0 - 500k)
+  ax_bot.set_ylim(min_1, max_1)
+  ax_bot.set_yticks(np.arange(min_1, max_1 + 1, incr_1))
+  ax_bot.yaxis.set_major_formatter(FuncFormatter(lambda v, p: f'${v/1e3:.0f}K'))
+
+  for index, label in enumerate(ax_bot.yaxis.get_ticklabels()):
+    if index % 2 != 0:
+      label.set_visible(False)
+
+  # second section (1.0M - 1.5M)
+  ax_top.set_ylim(min_2, max_2)
+  ax_top.set_yticks(np.arange(min_2, max_2 + 1, incr_2))
+  ax_top.yaxis.set_major_formatter(FuncFormatter(lambda v, p: f'${v/1e6:.2f}M'))
+
+  for index, label in enumerate(ax_top.yaxis.get_ticklabels()):
+    if index % 2 != 1:
+      label.set_visible(False)
+
+  # only show ticks on bottom axis
+  ax_bot.set_xticks(x)
+  ax_bot.set_xticklabels(inst_grps['Institution'], fontsize=8)
+  setp(ax_top.get_xticklabels(), visible=False)
+
+  # put funding amount on top of each bar
+  for i, amount in enumerate(inst_grps['Funding Amount']):
+    if amount <= ax_bot.get_ylim()[1]:
+      ax = ax_bot
+    else:
+      ax = ax_top
+    ylim = ax.get_ylim()
+    y_offset = 0.02 * (ylim[1] - ylim[0])
+    ax.text(i, amount + y_offset, format_funding_label(amount), ha='center', va='bottom', fontsize=8, clip_on=False)
+
+
+  # Additional info to display:
+  # The relative lengths of the bars in figure 4, with the total height of the chart as "1"
+  # strip newline characters from institution names for clarity, list number to 5 decimal places
+  TOTAL_UNITS = units_1 + units_2  # corresponds to y = 1,500,000 with split scaling
+
+  inst_grps = institution_metrics(inst_grps, INSTITUTION_AXIS_ALT)
+  info_text = '\n'.join([
+    f"Relative Lengths of Funding Amount Bars ({max_2} = 1.0):",
+    *info_lines(inst_grps['Institution'], inst_grps['Relative Length'], '{:.5f}'),
+    f"Distance between tick marks: {(1 / TOTAL_UNITS):.5f}\nTotal number of tick marks: {TOTAL_UNITS:.0f}",
+  ])
+
+  ax_info = inst_fig.add_subplot(inst_gs[1])
+  ax_info.axis('off')
+  ax_info.text(0.0, 0.5, info_text, fontsize=10, verticalalignment='center')
+
+  inst_fig.tight_layout()
+  return inst_fig
 
 
 # ----- FUNDING VISUALIZATIONS -----
-# Subplots (from proj_data):
+# Subplots (from funding_data):
 # 1. bar chart, 'Funding Type' vs. # of projects
 # 2. bar chart, 'Funding Type' vs. 'Funding Amount'
 # 3. bar chart, 'Funding Type' vs. average 'Funding Amount'
@@ -403,79 +532,77 @@ inst_fig.savefig('saved_figs/institution_visualizations_alt.png')
 # 3. average funding amount (average of 'Funding Amount' column)
 # Figure arrangement:
 # 2 rows, 2 columns (first two subplots on top row, third subplot on bottom left, additional info on bottom right)
-
-funding_fig = plt.figure(figsize=(12, 8))
-
-# Subplot 1: Funding Type vs. Project Count
-# sort by project count descending
-# y label: # of Projects
-# y tick marks go from 0 to 25 in increments of 5
-# put number on top of each bar
-ax1 = funding_fig.add_subplot(2, 2, 1)
-funding_type_counts = proj_data['Funding Type'].value_counts()
-ax1.bar(funding_type_counts.index, funding_type_counts.values)
-ax1.set_title('Funding Type vs. Project Count')
-ax1.tick_params(axis='x', labelsize=8)
-ax1.set_ylabel('# of Projects')
-ax1.set_ylim(0, 25)
-for i, (category, count) in enumerate(funding_type_counts.items()):
-  ax1.text(i, count + 0.125, str(count), ha='center', va='bottom')
-
-# Subplot 2: Funding Type vs. Total Funding Amount
-# sort by total funding amount descending
-# y label: Total Funding Amount
-# put number on top of each bar
-# y axis formatted as currency in units of 1.XM
-# y tick marks go from 0 to 3,000,000 in increments of 500,000
-ax2 = funding_fig.add_subplot(2, 2, 2)
-funding_amounts = proj_data.groupby('Funding Type')['Funding Amount'].sum().sort_values(ascending=False)
-ax2.bar(funding_amounts.index, funding_amounts.values)
-ax2.set_title('Funding Type vs. Total Funding Amount')
-ax2.tick_params(axis='x', labelsize=8)
-ax2.set_ylabel('Total Funding Amount')
-ax2.set_ylim(0, 3000000)
-ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x/1e6:.1f}M'))
-for i, (category, amount) in enumerate(funding_amounts.items()):
-  ax2.text(i, amount + 25000, f'${amount/1e6:.1f}M', ha='center', va='bottom')
-
-# Subplot 3: Funding Type vs. Average Funding Per Project
-# sort by average funding amount descending
-# y label: Average Funding Per Project
-# put number on top of each bar
-# if number is > 235000, put number just below top of bar instead and make it white
-# y axis formatted as currency in units of 1.XK
-ax3 = funding_fig.add_subplot(2, 2, 3)
-funding_averages = proj_data.groupby('Funding Type')['Funding Amount'].mean().sort_values(ascending=False)
-ax3.bar(funding_averages.index, funding_averages.values)
-ax3.set_title('Funding Type vs. Average Funding Per Project')
-ax3.tick_params(axis='x', labelsize=8)
-ax3.set_ylabel('Average Funding Per Project')
-ax3.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x/1e3:.1f}K'))
-for i, (category, avg_amount) in enumerate(funding_averages.items()):
-  if avg_amount > 235000:
-    ax3.text(i, avg_amount - 5000, f'${avg_amount/1e3:.1f}K', ha='center', va='top', color='white')
-  else:
-    ax3.text(i, avg_amount + 2500, f'${avg_amount/1e3:.1f}K', ha='center', va='bottom')
-
-# Additional info to display:
-# 1. total number of projects (sum of counts from first subplot)
-# 2. total funding amount (sum of 'Funding Amount' column)
-# 3. average funding amount (average of 'Funding Amount' column)
-
-funding_info = {
-  'total_projects': len(proj_data),
-  'total_funding': proj_data['Funding Amount'].sum(),
-  'average_funding': proj_data['Funding Amount'].mean()
-}
-info_text = (f"Total Projects: {funding_info['total_projects']}\n"
-             f"Total Funding Amount: ${funding_info['total_funding']:,.2f}\n"
-             f"Average Funding Per Project: ${funding_info['average_funding']:,.2f}")
-ax4 = funding_fig.add_subplot(2, 2, 4)
-ax4.axis('off')
-ax4.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
-
-plt.tight_layout()
-funding_fig.savefig('saved_figs/funding_visualizations.png')
+def plot_funding(funding_data):
+  from matplotlib.ticker import FuncFormatter
+  from figures import new_figure
+
+  funding_fig = new_figure(figsize=(12, 8))
+
+  # Subplot 1: Funding Type vs. Project Count
+  # sort by project count descending
+  # y label: # of Projects
+  # y tick marks go from 0 to 25 in increments of 5
+  # put number on top of each bar
+  ax1 = funding_fig.add_subplot(2, 2, 1)
+  funding_type_counts = funding_data['funding_type_counts']
+  ax1.bar(funding_type_counts.index, funding_type_counts.values)
+  ax1.set_title('Funding Type vs. Project Count')
+  ax1.tick_params(axis='x', labelsize=8)
+  ax1.set_ylabel('# of Projects')
+  ax1.set_ylim(0, 25)
+  for i, (category, count) in enumerate(funding_type_counts.items()):
+    ax1.text(i, count + 0.125, str(count), ha='center', va='bottom')
+
+  # Subplot 2: Funding Type vs. Total Funding Amount
+  # sort by total funding amount descending
+  # y label: Total Funding Amount
+  # put number on top of each bar
+  # y axis formatted as currency in units of 1.XM
+  # y tick marks go from 0 to 3,000,000 in increments of 500,000
+  ax2 = funding_fig.add_subplot(2, 2, 2)
+  funding_amounts = funding_data['funding_amounts']
+  ax2.bar(funding_amounts.index, funding_amounts.values)
+  ax2.set_title('Funding Type vs. Total Funding Amount')
+  ax2.tick_params(axis='x', labelsize=8)
+  ax2.set_ylabel('Total Funding Amount')
+  ax2.set_ylim(0, 3000000)
+  ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x/1e6:.1f}M'))
+  for i, (category, amount) in enumerate(funding_amounts.items()):
+    ax2.text(i, amount + 25000, f'${amount/1e6:.1f}M', ha='center', va='bottom')
+
+  # Subplot 3: Funding Type vs. Average Funding Per Project
+  # sort by average funding amount descending
+  # y label: Average Funding Per Project
+  # put number on top of each bar
+  # if number is > 235000, put number just below top of bar instead and make it white
+  # y axis formatted as currency in units of 1.XK
+  ax3 = funding_fig.add_subplot(2, 2, 3)
+  funding_averages = funding_data['funding_averages']
+  ax3.bar(funding_averages.index, funding_averages.values)
+  ax3.set_title('Funding Type vs. Average Funding Per Project')
+  ax3.tick_params(axis='x', labelsize=8)
+  ax3.set_ylabel('Average Funding Per Project')
+  ax3.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x/1e3:.1f}K'))
+  for i, (category, avg_amount) in enumerate(funding_averages.items()):
+    if avg_amount > 235000:
+      ax3.text(i, avg_amount - 5000, f'${avg_amount/1e3:.1f}K', ha='center', va='top', color='white')
+    else:
+      ax3.text(i, avg_amount + 2500, f'${avg_amount/1e3:.1f}K', ha='center', va='bottom')
+
+  # Additional info to display:
+  # 1. total number of projects (sum of counts from first subplot)
+  # 2. total funding amount (sum of 'Funding Amount' column)
+  # 3. average funding amount (average of 'Funding Amount' column)
+  funding_info = funding_data['funding_info']
+  info_text = (f"Total Projects: {funding_info['total_projects']}\n"
+               f"Total Funding Amount: ${funding_info['total_funding']:,.2f}\n"
+               f"Average Funding Per Project: ${funding_info['average_funding']:,.2f}")
+  ax4 = funding_fig.add_subplot(2, 2, 4)
+  ax4.axis('off')
+  ax4.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
+
+  funding_fig.tight_layout()
+  return funding_fig
 
 
 # ----- STUDENT VISUALIZATIONS -----
@@ -486,31 +613,32 @@ funding_fig.savefig('saved_figs/funding_visualizations.png')
 # 2. total number of students supported (sum of all 'Student Count' values)
 # Figure arrangement:
 # 1 row, 2 columns (first subplot on left, additional info on right)
-
-student_fig = plt.figure(figsize=(10, 5))
-
-# Subplot 1: Student Type vs. Student Count
-ax1 = student_fig.add_subplot(1, 2, 1)
-ax1.bar(stu_data['Student Type'], stu_data['Student Count'])
-ax1.set_title('Student Type vs. Student Count')
-ax1.tick_params(axis='x', labelsize=8)
-ax1.set_ylabel('Student Count')
-for i, v in enumerate(stu_data['Student Count']):
-  ax1.text(i, v + 0.125, str(v), ha='center', va='bottom')
-
-# Additional info to display:
-# 1. total number of students supported by WRRA $ (sum of 'Student Count' excluding 'Non-Federal')
-# 2. total number of students supported (sum of all 'Student Count' values)
-total_wrra_students = stu_data[stu_data['Student Type'] != 'Non-Federal']['Student Count'].sum()
-total_students = stu_data['Student Count'].sum()
-info_text = (f"Total Students Supported by WRRA Funding: {total_wrra_students}\n"
-             f"Total Students Supported: {total_students}")
-ax3 = student_fig.add_subplot(1, 2, 2)
-ax3.axis('off')
-ax3.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
-
-plt.tight_layout()
-student_fig.savefig('saved_figs/student_visualizations.png')
+def plot_students(stu_data):
+  from figures import new_figure
+
+  student_fig = new_figure(figsize=(10, 5))
+
+  # Subplot 1: Student Type vs. Student Count
+  ax1 = student_fig.add_subplot(1, 2, 1)
+  ax1.bar(stu_data['Student Type'], stu_data['Student Count'])
+  ax1.set_title('Student Type vs. Student Count')
+  ax1.tick_params(axis='x', labelsize=8)
+  ax1.set_ylabel('Student Count')
+  for i, v in enumerate(stu_data['Student Count']):
+    ax1.text(i, v + 0.125, str(v), ha='center', va='bottom')
+
+  # Additional info to display:
+  # 1. total number of students supported by WRRA $ (sum of 'Student Count' excluding 'Non-Federal')
+  # 2. total number of students supported (sum of all 'Student Count' values)
+  totals = student_totals(stu_data)
+  info_text = (f"Total Students Supported by WRRA Funding: {totals['total_wrra_students']}\n"
+               f"Total Students Supported: {totals['total_students']}")
+  ax3 = student_fig.add_subplot(1, 2, 2)
+  ax3.axis('off')
+  ax3.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
+
+  student_fig.tight_layout()
+  return student_fig
 
 
 # ----- SCIENCE PRIORITY VISUALIZATIONS -----
@@ -523,62 +651,345 @@ student_fig.savefig('saved_figs/student_visualizations.png')
 # The degrees that correspond to each section of the pie chart in subplot 2
 # Figure arrangement:
 # 2 rows, 2 columns (first subplot on top left, second subplot on top right, third subplot on bottom left, bottom right additional info)
-
-science_fig = plt.figure(figsize=(16, 12))
-
-# Subplot 1: WRRI Science Priority vs. Project Count
-ax1 = science_fig.add_subplot(2, 2, 1)
-ax1.bar(science_grps['WRRI Science Priority'], science_grps['Project Count'])
-ax1.set_title('WRRI Science Priority vs. Project Count')
-ax1.tick_params(axis='x', labelsize=8)
-ax1.set_ylabel('# of Projects')
-for i, v in enumerate(science_grps['Project Count']):
-  ax1.text(i, v + 0.125, str(v), ha='center', va='bottom')
-
-# Subplot 2: WRRI Science Priority vs. Project Count (Pie Chart)
-ax2 = science_fig.add_subplot(2, 2, 2)
-colors = cm.Pastel1(np.linspace(0, 1, len(science_grps)))
-ax2.pie(science_grps['Project Count'], labels=science_grps['WRRI Science Priority'], autopct='%1.1f%%', colors=colors, textprops={'fontsize': 8})
-ax2.set_title('WRRI Science Priority vs. Project Count (Pie Chart)')
-
-
-# Subplot 3: WRRI Science Priority vs. Funding Amount
-# y axis formatted as currency in units of XK (thousands)
-# put number on top of each bar in full currency format without cents
-# re-sort bars to be in descending order of funding amount
-ax3 = science_fig.add_subplot(2, 2, 3)
-science_grps = science_grps.sort_values(by='Funding Amount', ascending=False)
-ax3.bar(science_grps['WRRI Science Priority'], science_grps['Funding Amount'])
-ax3.set_title('WRRI Science Priority vs. Funding Amount')
-ax3.tick_params(axis='x', labelsize=8)
-ax3.set_ylabel('Funding Amount')
-ax3.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x/1e3:.0f}K'))
-for i, v in enumerate(science_grps['Funding Amount']):
-  ax3.text(i, v + 12500, f'${v:,.0f}', ha='center', va='bottom')
-
+def plot_science_priorities(science_grps):
+  from matplotlib import cm
+  from matplotlib.ticker import FuncFormatter
+  from figures import new_figure
+
+  science_fig = new_figure(figsize=(16, 12))
+
+  # Subplot 1: WRRI Science Priority vs. Project Count
+  ax1 = science_fig.add_subplot(2, 2, 1)
+  ax1.bar(science_grps['WRRI Science Priority'], science_grps['Project Count'])
+  ax1.set_title('WRRI Science Priority vs. Project Count')
+  ax1.tick_params(axis='x', labelsize=8)
+  ax1.set_ylabel('# of Projects')
+  for i, v in enumerate(science_grps['Project Count']):
+    ax1.text(i, v + 0.125, str(v), ha='center', va='bottom')
+
+  # Subplot 2: WRRI Science Priority vs. Project Count (Pie Chart)
+  ax2 = science_fig.add_subplot(2, 2, 2)
+  # no projects (e.g. a filter matching nothing): there is nothing to divide, the panel is left empty
+  if science_grps['Project Count'].sum() > 0:
+    colors = cm.Pastel1(np.linspace(0, 1, len(science_grps)))
+    ax2.pie(science_grps['Project Count'], labels=science_grps['WRRI Science Priority'], autopct='%1.1f%%', colors=colors, textprops={'fontsize': 8})
+  else:
+    ax2.axis('off')
+    ax2.text(0.5, 0.5, 'No projects', ha='center', va='center', fontsize=12)
+  ax2.set_title('WRRI Science Priority vs. Project Count (Pie Chart)')
+
+
+  # Subplot 3: WRRI Science Priority vs. Funding Amount
+  # y axis formatted as currency in units of XK (thousands)
+  # put number on top of each bar in full currency format without cents
+  # re-sort bars to be in descending order of funding amount
+  ax3 = science_fig.add_subplot(2, 2, 3)
+  science_grps = science_metrics(science_grps).sort_values(by='Funding Amount', ascending=False)
+  ax3.bar(science_grps['WRRI Science Priority'], science_grps['Funding Amount'])
+  ax3.set_title('WRRI Science Priority vs. Funding Amount')
+  ax3.tick_params(axis='x', labelsize=8)
+  ax3.set_ylabel('Funding Amount')
+  ax3.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x/1e3:.0f}K'))
+  for i, v in enumerate(science_grps['Funding Amount']):
+    ax3.text(i, v + 12500, f'${v:,.0f}', ha='center', va='bottom')
+
+  # Additional info to display:
+  # The relative lengths of each bar in subplot 3 to 4 decimal places, with 800000 being "1"
+  # The degrees that correspond to each section of the pie chart in subplot 2
+  # strip newlines from priority names for clarity
+  relative_lengths = science_grps['Relative Length']
+  length_lines = info_lines(science_grps['WRRI Science Priority'], relative_lengths, '{:.4f}')
+
+  science_grps = science_grps.sort_values(by=['Project Count'], ascending=False)
+
+  relative_degrees = science_grps['Pie Degrees']
+  degree_lines = info_lines(science_grps['WRRI Science Priority'], relative_degrees, '{:.1f}')
+
+  info_text = '\n'.join([
+    f"Relative Lengths of Funding Amount Bars ({SCIENCE_FUNDING_SCALE:,} = 1):", *length_lines,
+    '', 'Degrees Per Pie Slice:', *degree_lines, '',
+  ])
+
+  ax4 = science_fig.add_subplot(2, 2, 4)
+  ax4.axis('off')
+  ax4.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
+
+
+  science_fig.tight_layout()
+  return science_fig
+
+
+# ----- TREND VISUALIZATIONS -----
+# new DFs (from prod_data and award_data, see timeseries.py):
+# 'award_months': 'Month', 'Award Count', 'Award Amount', 'Rolling 12-Month Amount', every month from the first award to the last
+# 'award_years': 'Year', 'Award Count', 'Award Amount' (awards with a year but no month count here too)
+# 'publication_years': 'Year', 'Publications', 'Rolling 3-Year Publications'
+# 'trend_totals': 'Metric', 'Value', the awards and products left out of the trends for lack of a date
+def trend_tables(prod_data, award_data):
+  amounts = award_data['Monetary Benefit of Award']
+
+  month_codes = month_periods(award_data['Year Awarded'], award_data['Month Awarded'])
+  start, month_amounts = bin_periods(month_codes, amounts)
+  _, month_counts = bin_periods(month_codes, start=start, stop=start + len(month_amounts))
+  award_months = pd.DataFrame({
+    'Month': period_labels(start, len(month_amounts), 'M'),
+    'Award Count': month_counts,
+    'Award Amount': month_amounts,
+    'Rolling 12-Month Amount': rolling_sum(month_amounts, 12),
+  })
+
+  year_codes = year_periods(award_data['Year Awarded'])
+  start, year_amounts = bin_periods(year_codes, amounts)
+  _, year_counts = bin_periods(year_codes, start=start, stop=start + len(year_amounts))
+  award_years = pd.DataFrame({'Year': np.arange(start, start + len(year_amounts)), 'Award Count': year_counts, 'Award Amount': year_amounts})
+
+  pub_codes = year_periods(prod_data['Year of Publication'])
+  start, publications = bin_periods(pub_codes)
+  publication_years = pd.DataFrame({
+    'Year': np.arange(start, start + len(publications)),
+    'Publications': publications,
+    'Rolling 3-Year Publications': rolling_sum(publications, 3).astype(np.int64),
+  })
+
+  trend_totals = pd.DataFrame({
+    'Metric': ['Awards Without a Month', 'Awards Without a Year', 'Products Without a Year'],
+    'Value': [int((month_codes < 0).sum()), int((year_codes < 0).sum()), int((pub_codes < 0).sum())],
+  })
+  return {
+    'award_months': award_months,
+    'award_years': award_years,
+    'publication_years': publication_years,
+    'trend_totals': trend_totals,
+  }
+
+# trend_tables of the products and awards of the projects in mask
+# the source (ProjectCube or ProjectIndex) must come from an index built with prod_data and award_data
+def build_trends(source, mask=None):
+  index = getattr(source, 'index', source)
+  if index.prod_data is None or index.award_data is None:
+    raise ValueError('the trends need an index with the products and awards frames')
+  prod_data, award_data = index.prod_data, index.award_data
+
+  project_mask = source.project_mask(mask)
+  if project_mask is not None:
+    project_ids = index.rows(project_mask)['Project ID']
+    prod_data = prod_data[prod_data['Project ID'].isin(project_ids)]
+    award_data = award_data[award_data['Project ID'].isin(project_ids)]
+  return trend_tables(prod_data, award_data)
+
+# Subplots (from the tables of trend_tables):
+# 1. award amount per month (one filled step line, so decades of months stay a single artist) and its rolling 12-month sum
+# 2. bar chart, award amount per year
+# 3. bar chart, publications per year, and their rolling 3-year sum
 # Additional info to display:
-# The relative lengths of each bar in subplot 3 to 4 decimal places, with 800000 being "1"
-# The degrees that correspond to each section of the pie chart in subplot 2
-# strip newlines from priority names for clarity
-relative_lengths = science_grps['Funding Amount'] / 800000
-info_text = "Relative Lengths of Funding Amount Bars (800,000 = 1):\n"
-for priority, rel_length in zip(science_grps['WRRI Science Priority'], relative_lengths):
-  priority_long = priority.replace('\n', ' ')
-  info_text += f"{priority_long}: {rel_length:.4f}\n"
-
-science_grps.sort_values(by=['Project Count'], inplace=True, ascending=False)
-
-total_projects = science_grps['Project Count'].sum()
-relative_degrees = (science_grps['Project Count'] / total_projects) * 360
-info_text += "\nDegrees Per Pie Slice:\n"
-for priority, degrees in zip(science_grps['WRRI Science Priority'], relative_degrees):
-  priority_long = priority.replace('\n', ' ')
-  info_text += f"{priority_long}: {degrees:.1f}\n"
+# the awards and products without a date (left out of the charts)
+# Figure arrangement:
+# 2 rows, 2 columns (monthly on top left, yearly awards top right, publications bottom left, bottom right additional info)
+def plot_trends(trends):
+  from matplotlib.ticker import FuncFormatter, MaxNLocator
+  from figures import new_figure
+
+  trend_fig = new_figure(figsize=(16, 10))
+  currency = FuncFormatter(lambda x, p: f'${x/1e3:,.0f}K')
+
+  # Subplot 1: Award Amount per Month
+  # x axis is the month position, at most 12 ticks labelled with their month
+  award_months = trends['award_months']
+  months = award_months['Month'].tolist()
+  x = np.arange(len(months))
+  ax1 = trend_fig.add_subplot(2, 2, 1)
+  ax1.fill_between(x, award_months['Award Amount'], step='mid', alpha=0.5, label='Award Amount')
+  ax1.plot(x, award_months['Rolling 12-Month Amount'], drawstyle='steps-mid', color='tab:orange', label='Rolling 12-Month Sum')
+  ax1.set_title('Award Amount per Month')
+  ax1.xaxis.set_major_locator(MaxNLocator(12, integer=True))
+  ax1.xaxis.set_major_formatter(FuncFormatter(lambda v, p: months[int(v)] if 0 <= v < len(months) else ''))
+  ax1.tick_params(axis='x', labelsize=8, labelrotation=45)
+  ax1.yaxis.set_major_formatter(currency)
+  ax1.legend()
+
+  # Subplot 2: Award Amount per Year
+  award_years = trends['award_years']
+  ax2 = trend_fig.add_subplot(2, 2, 2)
+  ax2.bar(award_years['Year'], award_years['Award Amount'])
+  ax2.set_title('Award Amount per Year')
+  ax2.xaxis.set_major_locator(MaxNLocator(12, integer=True))
+  ax2.yaxis.set_major_formatter(currency)
+
+  # Subplot 3: Publications per Year
+  publication_years = trends['publication_years']
+  ax3 = trend_fig.add_subplot(2, 2, 3)
+  ax3.bar(publication_years['Year'], publication_years['Publications'], label='Publications')
+  ax3.plot(publication_years['Year'], publication_years['Rolling 3-Year Publications'], color='tab:orange', marker='o', label='Rolling 3-Year Sum')
+  ax3.set_title('Publications per Year')
+  ax3.xaxis.set_major_locator(MaxNLocator(12, integer=True))
+  ax3.set_ylabel('# of Publications')
+  ax3.legend()
+
+  totals = trends['trend_totals']
+  info_text = '\n'.join([
+    f"Total Award Amount: ${award_years['Award Amount'].sum():,.0f}",
+    f"Total Publications: {publication_years['Publications'].sum()}", '',
+    'Left Out of the Charts:', *info_lines(totals['Metric'], totals['Value'], '{}'),
+  ])
+  ax4 = trend_fig.add_subplot(2, 2, 4)
+  ax4.axis('off')
+  ax4.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
+
+  trend_fig.tight_layout()
+  return trend_fig
+
+
+# every figure this script can draw
+# name -> (function building the figure's data from a ProjectCube / ProjectIndex and mask, function drawing the figure from that data)
+# the name is also the file name the figure is saved under in FIG_DIR
+FIGURES = {
+  'institution_visualizations': (build_inst_grps, plot_institutions),
+  'institution_visualizations_alt': (build_inst_grps, plot_institutions_alt),
+  'funding_visualizations': (build_funding_data, plot_funding),
+  'student_visualizations': (build_stu_data, plot_students),
+  'science_priority_visualizations': (build_science_grps, plot_science_priorities),
+  'trend_visualizations': (build_trends, plot_trends),
+}
 
-ax4 = science_fig.add_subplot(2, 2, 4)
-ax4.axis('off')
-ax4.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
+# build and draw one of the figures in FIGURES from the cells of a ProjectCube (or projects of a ProjectIndex) in mask
+# (everything if mask is None)
+def make_figure(name, source, mask=None):
+  build, plot = FIGURES[name]
+  return plot(build(source, mask))
+
+
+# ----- SUMMARIES -----
+# the numbers behind the figures (tables and info panels), without drawing anything (and without importing matplotlib)
+# name -> DataFrame, the name is also the file name the table is written under in SUMMARY_DIR
+def build_summaries(source, mask=None):
+  funding_data = build_funding_data(source, mask)
+  funding_types = pd.DataFrame({
+    'Project Count': funding_data['funding_type_counts'],
+    'Funding Amount': funding_data['funding_amounts'],
+    'Average Funding': funding_data['funding_averages'],
+  }).sort_values('Project Count', ascending=False).rename_axis('Funding Type').reset_index()
+
+  stu_data = build_stu_data(source, mask)
+  funding_info = funding_data['funding_info']
+  stu_totals = student_totals(stu_data)
+  totals = pd.DataFrame({
+    'Metric': ['Total Projects', 'Total Funding Amount', 'Average Funding Per Project',
+               'Total Students Supported by WRRA Funding', 'Total Students Supported'],
+    'Value': pd.Series([funding_info['total_projects'], funding_info['total_funding'], funding_info['average_funding'],
+                        stu_totals['total_wrra_students'], stu_totals['total_students']], dtype=object),
+  })
+
+  # relative lengths on the axes of both institution figures
+  institutions = institution_metrics(build_inst_grps(source, mask, wrap=False), INSTITUTION_AXIS)
+  institutions['Relative Length Alt'] = relative_bar_lengths(institutions['Funding Amount'], INSTITUTION_AXIS_ALT)
+
+  return {
+    'science_priorities': science_metrics(build_science_grps(source, mask, wrap=False)),
+    'institutions': institutions,
+    'funding_types': funding_types,
+    'students': stu_data,
+    'totals': totals,
+    **build_trends(source, mask),
+  }
+
+# dimensions of the cube the summaries can be partitioned by, option value -> column
+PARTITIONS = {
+  'institution': 'PI Affiliated Organization',
+  'priority': 'WRRI Science Priority',
+  'funding_type': 'Funding Type',
+  'year': 'Project Year',
+}
 
+# the summaries of every value of column (one of PARTITIONS) in one table per summary,
+# the value each row belongs to is in the first column, 'Partition'
+def build_partition_summaries(cube, column, mask=None):
+  codes, categories = cube.codes[column]
+  tables = {}
+  for i, value in enumerate(categories):
+    # the years are a float column ('Project Year'), written as 2020 rather than 2020.0
+    if isinstance(value, float) and value.is_integer():
+      value = int(value)
+    partition_mask = codes == i if mask is None else (codes == i) & mask
+    for name, table in build_summaries(cube, partition_mask).items():
+      tables.setdefault(name, []).append(table.assign(Partition=value))
+  return {
+    name: pd.concat(parts, ignore_index=True)[['Partition'] + [col for col in parts[0].columns if col != 'Partition']]
+    for name, parts in tables.items()
+  }
+
+# file formats the summaries can be written in, extension -> function writing a table to a path
+# (parquet needs pyarrow or fastparquet)
+SUMMARY_FORMATS = {
+  'csv': lambda table, path: table.to_csv(path, index=False),
+  'json': lambda table, path: table.to_json(path, orient='records', indent=2),
+  'parquet': lambda table, path: table.to_parquet(path, index=False),
+}
 
-plt.tight_layout()
-science_fig.savefig('saved_figs/science_priority_visualizations.png')
+# write each summary table to <out_dir>/<name>.<fmt>
+def write_summaries(summaries, out_dir=SUMMARY_DIR, fmt='csv'):
+  os.makedirs(out_dir, exist_ok=True)
+  for name, table in summaries.items():
+    SUMMARY_FORMATS[fmt](table, os.path.join(out_dir, f'{name}.{fmt}'))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Print the summary tables and save the figures of the project data.')
+  parser.add_argument('--data-dir', default=DATA_DIR)
+  parser.add_argument('--source', help='directory or glob of the workbooks to read (default: the .xlsx files in --data-dir)')
+  parser.add_argument('--workers', type=int, help='processes parsing the workbooks')
+  parser.add_argument('--fig-dir', default=FIG_DIR)
+  parser.add_argument('--summary-dir', default=SUMMARY_DIR)
+  parser.add_argument('--summaries-only', action='store_true',
+                      help='write the summary tables to --summary-dir and skip the figures (matplotlib is never imported)')
+  parser.add_argument('--summary-format', choices=sorted(SUMMARY_FORMATS), default='csv')
+  parser.add_argument('--keywords', help="only include projects matching a keyword query, e.g. 'pfas OR stormwater'")
+  parser.add_argument('--partition-by', choices=sorted(PARTITIONS), action='append', default=[],
+                      help='also write the summaries of every institution / priority / ... to <summary-dir>/by_<partition>/')
+  args = parser.parse_args(argv)
+
+  failures = export_sheets(args.data_dir, args.source, args.workers)
+  for path, error in failures:
+    print(f'skipped {path}: {error}')
+  raw_data = read_data(args.data_dir)
+
+  # check the data before spending time on the figures, stops here if there are errors
+  report = validate(*raw_data, EXCLUDED_INSTITUTIONS, EXCLUDED_STAGES)
+  print(report.format())
+  report.raise_for_errors()
+
+  proj_data, prod_data, award_data = clean_data(*raw_data)
+  index = ProjectIndex(proj_data, text=load_text_index(args.data_dir, proj_data, prod_data, award_data),
+                       prod_data=prod_data, award_data=award_data)
+
+  mask = None
+  if args.keywords:
+    mask = index.mask(keywords(args.keywords))
+    print(f'{index.count(mask)} projects match {args.keywords!r}')
+    if index.count(mask) == 0:
+      # nothing to summarize or draw, the files of earlier runs are left as they are
+      return
+  cube = build_cube(index, mask)
+
+  print(build_science_grps(cube).to_string())
+  print(build_inst_grps(cube).to_string())
+
+  if args.summaries_only:
+    write_summaries(build_summaries(cube), args.summary_dir, args.summary_format)
+    for partition in args.partition_by:
+      partition_dir = os.path.join(args.summary_dir, f'by_{partition}')
+      write_summaries(build_partition_summaries(cube, PARTITIONS[partition]), partition_dir, args.summary_format)
+    return
+
+  from figures import FigureManager, FigureWriter
+
+  # every figure is released right after it is drawn, the files are encoded and written in the background
+  os.makedirs(args.fig_dir, exist_ok=True)
+  manager = FigureManager()
+  with FigureWriter(manager) as writer:
+    for name in FIGURES:
+      writer.save(name, lambda: make_figure(name, cube), os.path.join(args.fig_dir, f'{name}.png'))
+  print(manager.report())
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,244 @@
+import argparse
+import itertools
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from rules import canonicalize
+
+# ----- ENTITY RESOLUTION -----
+# spellings of the same person ('Dr. David Lampert', 'David Lampert', 'Lampert, David') or organization
+# merged into one canonical name, so PI and institution totals aren't split between spellings
+#
+# 1. normalize    - accents, case, punctuation, honorifics / suffixes and 'Last, First' order are folded away
+# 2. block        - every normalized name gets a blocking key (first initial + last name for people, the initials of
+#                   the significant words for organizations), only names sharing a key are compared
+# 3. compare      - dice similarity of the character trigrams of every pair in a block, computed for all blocks at
+#                   once by joining the (block, trigram) rows with themselves
+# 4. cluster      - names connected by a similarity >= THRESHOLDS[kind] form one entity, named by the spelling used
+#                   by the most rows (then the shortest)
+#
+# the result is kept in an alias table (ALIASES_FILE, columns Kind, Name, Canonical) that later runs load:
+# names already in it keep their canonical name, only new names are resolved (against the known canonical names)
+# wrong merges can be fixed by editing the Canonical column
+#
+#   table = resolve_frames({'projects': proj_data, 'awards': award_data})
+#   proj_data['Project PIs'] = apply_aliases(proj_data['Project PIs'], table, 'person')
+
+ALIASES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aliases.csv')
+
+HONORIFICS = {'dr', 'prof', 'professor', 'mr', 'mrs', 'ms', 'miss'}
+SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'phd', 'md'}
+ORG_STOPWORDS = {'of', 'at', 'the', 'and', 'for', 'in', 'on'}
+
+# smallest trigram dice similarity for two names in a block to be the same entity
+THRESHOLDS = {'person': 0.6, 'organization': 0.8}
+
+# columns holding each kind of name, kind -> [(frame, column)], frames are 'projects' and 'awards'
+NAME_COLUMNS = {
+  'person': [('projects', 'Project PIs'), ('awards', 'Award Recipient Names')],
+  'organization': [('projects', 'PI Affiliated Organization')],
+}
+
+# utility function to split a name into lower case ascii words ('&' becomes 'and')
+def _words(name):
+  name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').casefold()
+  return re.sub(r'[^a-z0-9]+', ' ', name.replace('&', ' and ')).split()
+
+def normalize_person(name):
+  # 'Tinoco Lopez, Rafael Omar' -> 'Rafael Omar Tinoco Lopez'
+  if name.count(',') == 1:
+    last, first = name.split(',')
+    if not set(_words(first)) <= SUFFIXES:
+      name = f'{first} {last}'
+  words = _words(name)
+  while words and words[0] in HONORIFICS:
+    words = words[1:]
+  while words and words[-1] in SUFFIXES:
+    words = words[:-1]
+  return ' '.join(words)
+
+def person_block(normalized):
+  words = normalized.split()
+  return f'{words[0][0]} {words[-1]}' if words else ''
+
+def normalize_organization(name):
+  words = _words(name)
+  if words[:1] == ['the']:
+    words = words[1:]
+  return ' '.join(words)
+
+def organization_block(normalized):
+  return ''.join(word[0] for word in normalized.split() if word not in ORG_STOPWORDS)
+
+# kind -> (normalize, block)
+KINDS = {
+  'person': (normalize_person, person_block),
+  'organization': (normalize_organization, organization_block),
+}
+
+def trigrams(text):
+  padded = f'  {text} '
+  return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# number of pairs compared for the given block codes (all-pairs would be n * (n - 1) / 2)
+def block_pair_count(blocks):
+  sizes = np.bincount(blocks)
+  return int((sizes * (sizes - 1) // 2).sum())
+
+# pairs (i, j), i < j, of texts in the same block with a trigram dice similarity >= threshold
+# texts: list of distinct normalized names, blocks: integer block code of each
+def similar_pairs(texts, blocks, threshold):
+  blocks = np.asarray(blocks)
+  grams = [trigrams(text) for text in texts]
+  sizes = np.array([len(g) for g in grams])
+  ids = np.repeat(np.arange(len(texts)), sizes)
+  gram_codes, _ = pd.factorize(np.array(list(itertools.chain.from_iterable(grams)), dtype=object))
+
+  # (block, trigram, name) rows, names alone in their block can't pair with anything
+  keep = np.bincount(blocks)[blocks[ids]] > 1
+  rows = pd.DataFrame({'block': blocks[ids][keep], 'gram': gram_codes[keep], 'id': ids[keep]})
+
+  # shared trigrams of every pair in a block
+  shared = rows.merge(rows, on=['block', 'gram'])
+  shared = shared[shared['id_x'] < shared['id_y']]
+  counts = shared.groupby(['id_x', 'id_y']).size()
+
+  a = counts.index.get_level_values('id_x').to_numpy()
+  b = counts.index.get_level_values('id_y').to_numpy()
+  dice = 2 * counts.to_numpy() / (sizes[a] + sizes[b])
+  match = dice >= threshold
+  return a[match], b[match]
+
+# connected component label (smallest member) of each of n nodes, given edges (a, b)
+def connected_labels(n, a, b):
+  labels = np.arange(n)
+  while True:
+    low = np.minimum(labels[a], labels[b])
+    new = labels.copy()
+    np.minimum.at(new, a, low)
+    np.minimum.at(new, b, low)
+    new = new[new]
+    if np.array_equal(new, labels):
+      return labels
+    labels = new
+
+# alias table rows (Kind, Name, Canonical) for the spellings in names (a series, one name per row)
+# that aren't in aliases yet, aliases are the rows of earlier runs
+def resolve(names, kind, aliases=None, threshold=None):
+  normalize, block = KINDS[kind]
+  threshold = THRESHOLDS[kind] if threshold is None else threshold
+  rows = names.dropna().astype(str).value_counts(sort=False)
+
+  known = {} if aliases is None else dict(zip(*aliases.loc[aliases['Kind'] == kind, ['Name', 'Canonical']].to_numpy().T))
+  # a canonical name is known too, it already stands for its entity
+  canonical_names = set(known.values())
+  new = [name for name in rows.index if name not in known and name not in canonical_names]
+  if not new:
+    return pd.DataFrame(columns=['Kind', 'Name', 'Canonical'])
+
+  # the known canonical names take part too, so new spellings of them get the same name
+  anchors = sorted(set(known.values()) - set(new))
+  spellings = pd.Index(new + anchors)
+  norm_codes, norms = pd.factorize(np.array([normalize(name) for name in spellings], dtype=object))
+  block_codes, _ = pd.factorize(np.array([block(norm) for norm in norms], dtype=object))
+  a, b = similar_pairs(list(norms), block_codes, threshold)
+
+  # the canonical name is picked among the stripped, single spaced spellings ('Kaiyu Guan ' -> 'Kaiyu Guan'),
+  # spellings that only differ in spacing pool their rows
+  cleaned = spellings.str.split().str.join(' ')
+  entities = pd.DataFrame({
+    'Name': spellings,
+    'Spelling': cleaned,
+    'entity': connected_labels(len(norms), a, b)[norm_codes],
+    'anchor': spellings.isin(anchors),
+    'rows': rows.reindex(spellings, fill_value=0).to_numpy(),
+    'length': cleaned.str.len(),
+  })
+  entities['rows'] = entities.groupby('Spelling')['rows'].transform('sum')
+  preferred = entities.sort_values(['anchor', 'rows', 'length', 'Spelling'], ascending=[False, False, True, True])
+  canonical = preferred.drop_duplicates('entity').set_index('entity')['Spelling']
+  entities['Canonical'] = canonical.loc[entities['entity']].to_numpy()
+
+  entities = entities[~entities['anchor']]
+  return pd.DataFrame({'Kind': kind, 'Name': entities['Name'].to_numpy(), 'Canonical': entities['Canonical'].to_numpy()})
+
+def load_aliases(path=ALIASES_FILE):
+  if not os.path.exists(path):
+    return pd.DataFrame(columns=['Kind', 'Name', 'Canonical'])
+  return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def save_aliases(aliases, path=ALIASES_FILE):
+  aliases.sort_values(['Kind', 'Canonical', 'Name']).to_csv(path, index=False)
+
+# resolve the names of every column in NAME_COLUMNS, add the new ones to the alias table at path and return the table
+# frames: {'projects': proj_data, 'awards': award_data}
+def resolve_frames(frames, path=ALIASES_FILE):
+  aliases = load_aliases(path)
+  for kind, columns in NAME_COLUMNS.items():
+    names = pd.concat([frames[name][col].astype(object) for name, col in columns if col in frames[name].columns])
+    aliases = pd.concat([aliases, resolve(names, kind, aliases)], ignore_index=True)
+  save_aliases(aliases, path)
+  return aliases
+
+# series with its names replaced by their canonical names (names not in the table are left as they are)
+# returns a categorical series with sorted categories, like rules.canonicalize
+def apply_aliases(series, aliases, kind):
+  kind_aliases = aliases[(aliases['Kind'] == kind) & (aliases['Name'] != aliases['Canonical'])]
+  if kind_aliases.empty:
+    return series
+  return canonicalize(series, {'aliases': dict(zip(kind_aliases['Name'], kind_aliases['Canonical']))})
+
+# apply the alias table to every column in NAME_COLUMNS of frames, {'projects': proj_data, 'awards': award_data}
+def apply_frames(frames, aliases):
+  frames = dict(frames)
+  for kind, columns in NAME_COLUMNS.items():
+    for name, col in columns:
+      if col in frames[name].columns:
+        frames[name] = frames[name].assign(**{col: apply_aliases(frames[name][col], aliases, kind)})
+  return frames
+
+
+# new DF (from proj_data and award_data, names already resolved):
+# one row per PI with their project count, funding, and the count and value of the awards they received
+def build_pi_report(proj_data, award_data):
+  projects = proj_data.groupby('Project PIs', observed=True).agg(
+    **{'Project Count': ('Project ID', 'size'), 'Funding Amount': ('Funding Amount', 'sum')}
+  )
+  awards = award_data.groupby('Award Recipient Names', observed=True).agg(
+    **{'Award Count': ('Project ID', 'size'), 'Award Amount': ('Monetary Benefit of Award', 'sum')}
+  )
+  report = projects.join(awards, how='outer').fillna(0).rename_axis('PI').reset_index()
+  report[['Project Count', 'Award Count']] = report[['Project Count', 'Award Count']].astype(int)
+  return report.sort_values('Funding Amount', ascending=False)
+
+
+def main():
+  import datavis
+
+  parser = argparse.ArgumentParser(description='Merge spellings of the same PI / organization and write the PI report.')
+  parser.add_argument('--data-dir', default=datavis.DATA_DIR)
+  parser.add_argument('--aliases', default=ALIASES_FILE, help='alias table to read and update')
+  parser.add_argument('--summary-dir', default=datavis.SUMMARY_DIR)
+  args = parser.parse_args()
+
+  # resolved from the spellings as they were written, not the ones the alias table already rewrote
+  proj_data, _, award_data = datavis.clean_data(*datavis.read_data(args.data_dir), aliases=pd.DataFrame(columns=['Kind', 'Name', 'Canonical']))
+  aliases = resolve_frames({'projects': proj_data, 'awards': award_data}, args.aliases)
+  frames = apply_frames({'projects': proj_data, 'awards': award_data}, aliases)
+
+  merged = aliases[aliases['Name'] != aliases['Canonical']]
+  for (kind, canonical), group in merged.groupby(['Kind', 'Canonical']):
+    print(f"{kind}: {canonical} <- {', '.join(group['Name'])}")
+
+  os.makedirs(args.summary_dir, exist_ok=True)
+  report = build_pi_report(frames['projects'], frames['awards'])
+  report.to_csv(os.path.join(args.summary_dir, 'pis.csv'), index=False)
+  print(report.to_string(index=False))
+
+
+if __name__ == '__main__':
+  main()
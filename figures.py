@@ -0,0 +1,217 @@
+import io
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+
+from atomic import write_atomic
+
+# ----- FIGURE LIFECYCLE -----
+# figures are created here instead of with plt.figure, so pyplot never holds on to them:
+# a figure lives until release() is called on it (FigureManager.save does that right after saving)
+#
+# the Agg canvas of a released figure is kept and handed to the next figure of the same size,
+# so its pixel buffer (the renderer) is reused instead of allocated again for every figure
+
+# released canvases that can be reused, (width, height, dpi) -> canvas
+_free_canvases = {}
+
+# utility function to read the resident memory of this process in bytes (None if the platform doesn't say)
+def rss_bytes():
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, AttributeError):
+    return None
+
+# utility function to read the peak resident memory of this process in bytes (VmHWM), since the last reset_peak_rss()
+# (None if the platform doesn't say)
+def peak_rss_bytes():
+  try:
+    with open('/proc/self/status') as f:
+      for line in f:
+        if line.startswith('VmHWM:'):
+          return int(line.split()[1]) * 1024
+  except (OSError, ValueError):
+    pass
+  return None
+
+# utility function to reset the peak resident memory to the current one (linux), False if the platform can't
+def reset_peak_rss():
+  try:
+    with open('/proc/self/clear_refs', 'w') as f:
+      f.write('5')
+    return True
+  except OSError:
+    return False
+
+# utility function to get the size in bytes of the Agg pixel buffer fig was last drawn into (None if it wasn't)
+def buffer_bytes(fig):
+  renderer = getattr(fig.canvas, 'renderer', None)
+  return None if renderer is None else int(renderer.width) * int(renderer.height) * 4
+
+# a new figure with an Agg canvas, not registered with pyplot
+def new_figure(figsize=None, dpi=None):
+  fig = Figure(figsize=figsize, dpi=dpi)
+  canvas = _free_canvases.pop(_canvas_key(fig), None)
+  if canvas is None:
+    FigureCanvasAgg(fig)
+  else:
+    canvas.figure = fig
+    fig.set_canvas(canvas)
+  return fig
+
+def _canvas_key(fig):
+  return (fig.bbox.width, fig.bbox.height, fig.dpi)
+
+# drop everything drawn on fig and keep its canvas for the next figure of the same size
+def release(fig):
+  canvas = fig.canvas
+  fig.clear()
+  if type(canvas) is FigureCanvasAgg:
+    _free_canvases[_canvas_key(fig)] = canvas
+
+
+# saves figures, releases them right after, and records how much memory each one took:
+#   peak_growth_bytes - how far the resident memory of the process rose above where it was when the figure was started,
+#                       which includes the Agg pixel buffer and everything else allocated outside python (None if it
+#                       can't be measured, with FigureWriter it also covers the writer threads encoding earlier figures)
+#   peak_rss_bytes    - that peak as the whole resident memory of the process
+#   buffer_bytes      - size of the Agg pixel buffer the figure was drawn into
+#   python_peak_bytes - peak of the python allocations (tracemalloc, only with track_memory)
+#   rss_bytes         - resident memory after the figure was saved and released
+#   manager = FigureManager()
+#   manager.save('funding', lambda: make_figure('funding_visualizations', cube), 'saved_figs/funding.png')
+#   print(manager.report())
+class FigureManager:
+  # track_memory: also trace python allocations (slower), so the peak per figure can be reported
+  def __init__(self, track_memory=False):
+    self.track_memory = track_memory
+    self.stats = []
+
+  # make() builds the figure, fname and savefig_kwargs go to fig.savefig
+  def save(self, name, make, fname, **savefig_kwargs):
+    started = self._start()
+    fig = make()
+    try:
+      fig.savefig(fname, **savefig_kwargs)
+    finally:
+      buffer = buffer_bytes(fig)
+      release(fig)
+      self._finish(name, started, buffer)
+
+  def _start(self):
+    if self.track_memory:
+      if not tracemalloc.is_tracing():
+        tracemalloc.start()
+      tracemalloc.reset_peak()
+    start_rss = rss_bytes() if reset_peak_rss() else None
+    return time.perf_counter(), tracemalloc.get_traced_memory()[0] if self.track_memory else None, start_rss
+
+  def _finish(self, name, started, buffer=None):
+    start_time, start_traced, start_rss = started
+    peak = peak_rss_bytes() if start_rss is not None else None
+    stat = {
+      'figure': name,
+      'seconds': time.perf_counter() - start_time,
+      'peak_growth_bytes': None if peak is None else max(peak - start_rss, 0),
+      'peak_rss_bytes': peak,
+      'buffer_bytes': buffer,
+      'rss_bytes': rss_bytes(),
+      'python_peak_bytes': None,
+    }
+    if self.track_memory:
+      stat['python_peak_bytes'] = tracemalloc.get_traced_memory()[1] - start_traced
+    self.stats.append(stat)
+
+  def stop(self):
+    if self.track_memory and tracemalloc.is_tracing():
+      tracemalloc.stop()
+
+  # one line per saved figure
+  def report(self):
+    lines = []
+    for stat in self.stats:
+      line = f"{stat['figure']}: {stat['seconds']:.2f}s"
+      if stat['peak_growth_bytes'] is not None:
+        line += f", peak +{stat['peak_growth_bytes'] / 2**20:.1f} MiB (rss {stat['peak_rss_bytes'] / 2**20:.1f} MiB)"
+      if stat['buffer_bytes'] is not None:
+        line += f", buffer {stat['buffer_bytes'] / 2**20:.1f} MiB"
+      if stat['python_peak_bytes'] is not None:
+        line += f", python peak {stat['python_peak_bytes'] / 2**20:.1f} MiB"
+      if stat['rss_bytes'] is not None:
+        line += f", rss {stat['rss_bytes'] / 2**20:.1f} MiB"
+      lines.append(line)
+    return '\n'.join(lines)
+
+
+# runs in a writer thread: PNG-encode an RGBA buffer and write it (same bytes fig.savefig would write)
+def _write_png(rgba, dpi, path):
+  write_atomic(path, lambda f: imsave(f, rgba, format='png', origin='upper', dpi=dpi))
+
+
+# pipelined FigureManager.save: the calling thread draws the figure into the Agg buffer, copies the pixels and
+# releases the figure, a pool of writer threads PNG-encodes and writes the file, so the caller can go on to
+# build the next figure while the previous ones are compressed and written
+#   with FigureWriter(manager) as writer:
+#     for name in FIGURES:
+#       writer.save(name, lambda: make_figure(name, cube), f'saved_figs/{name}.png')
+# at most max_pending figures wait for a writer, save blocks when that many are queued (back-pressure)
+# formats other than png are drawn by savefig on the calling thread, only their write is handed off
+# errors from the writers are raised by close() (the end of the with block)
+class FigureWriter:
+  def __init__(self, manager=None, workers=2, max_pending=4):
+    self.manager = manager if manager is not None else FigureManager()
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='figure-writer')
+    self._slots = threading.BoundedSemaphore(max_pending)
+    self._errors = []
+    # seconds save spent waiting for a free slot
+    self.blocked_seconds = 0.0
+
+  # make() builds the figure, it is written to fname (a path) in the format given by its extension
+  def save(self, name, make, fname, **savefig_kwargs):
+    fmt = os.path.splitext(fname)[1][1:].lower() or 'png'
+    started = self.manager._start()
+    fig = make()
+    try:
+      if fmt == 'png' and type(fig.canvas) is FigureCanvasAgg and not savefig_kwargs:
+        fig.canvas.draw()
+        # copied, since the canvas (and its buffer) goes to the next figure
+        job = (_write_png, np.array(fig.canvas.buffer_rgba()), fig.dpi, fname)
+      else:
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, **savefig_kwargs)
+        job = (write_atomic, fname, lambda f, data=buf.getvalue(): f.write(data))
+    finally:
+      buffer = buffer_bytes(fig)
+      release(fig)
+      self.manager._finish(name, started, buffer)
+
+    waited = time.perf_counter()
+    self._slots.acquire()
+    self.blocked_seconds += time.perf_counter() - waited
+
+    self._executor.submit(*job).add_done_callback(self._done)
+
+  def _done(self, future):
+    self._slots.release()
+    if future.exception() is not None:
+      self._errors.append(future.exception())
+
+  # wait for every queued figure to be written, raises the first error a writer ran into
+  def close(self):
+    self._executor.shutdown(wait=True)
+    if self._errors:
+      raise self._errors[0]
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
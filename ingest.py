@@ -0,0 +1,108 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# ----- WORKBOOK INGESTION -----
+# read the projects, products and awards sheets of many workbooks (one per institute per year) into one set of frames
+#
+#   frames, failures = load_workbooks('data/workbooks')      # a directory: every .xlsx file in it
+#   frames, failures = load_workbooks('data/*/IL_*.xlsx')    # or a glob
+#
+# - the workbooks are parsed in a process pool, one task per file
+# - every row gets the file it came from in SOURCE_COLUMN
+# - column headers are harmonised (whitespace, renames from rules.json "<frame>": {"rename": {...}}),
+#   and a column missing from some files is empty for their rows
+# - the frames of every file are concatenated once, at the end, in the order of the file names
+# - a file that can't be read is reported in failures and left out, the other files are still loaded,
+#   if none of them can be read load_workbooks raises ValueError
+# - a frame none of the files that were read has a sheet for is left out of the frames
+# - progress(message) is called as each file finishes (print by default)
+
+# frame -> name of its sheet in a workbook
+SHEETS = {
+  'projects': 'projects_data',
+  'products': 'products_data',
+  'awards': 'awards_data',
+}
+
+# column holding the name of the workbook every row was read from
+SOURCE_COLUMN = 'Source Workbook'
+
+# the workbooks in a directory, or matching a glob pattern, sorted by name
+# (files excel keeps open, '~$...xlsx', are skipped)
+def find_workbooks(source):
+  pattern = os.path.join(source, '*.xlsx') if os.path.isdir(source) else source
+  return sorted(path for path in glob.glob(pattern) if not os.path.basename(path).startswith('~$'))
+
+# runs in a worker: {frame: DataFrame} of the sheets of one workbook, tagged with its file name
+# raises ValueError if the workbook has none of the SHEETS
+def read_workbook(path):
+  with pd.ExcelFile(path) as xls:
+    sheets = {name: sheet for name, sheet in SHEETS.items() if sheet in xls.sheet_names}
+    if not sheets:
+      raise ValueError(f'none of the sheets {sorted(SHEETS.values())} in {os.path.basename(path)}')
+    frames = {name: pd.read_excel(xls, sheet_name=sheet) for name, sheet in sheets.items()}
+  for frame in frames.values():
+    frame[SOURCE_COLUMN] = os.path.basename(path)
+  return frames
+
+# frame with its headers stripped / single spaced and renamed following rename ({old header: new header})
+def harmonize(frame, rename=None):
+  frame = frame.rename(columns=lambda col: ' '.join(str(col).split()))
+  return frame.rename(columns=rename) if rename else frame
+
+# one frame per name in SHEETS from every workbook in source (a directory or glob), and the list of
+# (path, error message) of the workbooks that couldn't be read
+# rules: cleaning rules (see rules.py), only their "rename" entries are used here
+# workers: processes parsing the workbooks (one file is parsed in this process)
+def load_workbooks(source, rules=None, workers=None, progress=print):
+  paths = find_workbooks(source)
+  if not paths:
+    raise FileNotFoundError(f'no workbooks in {source}')
+
+  results = {}
+  failures = []
+  start = time.perf_counter()
+
+  def finished(path, frames=None, error=None):
+    done = len(results) + len(failures) + 1
+    if error is None:
+      results[path] = frames
+      counts = ', '.join(f'{len(frames[name])} {name}' for name in SHEETS if name in frames)
+      message = f'[{done}/{len(paths)}] {os.path.basename(path)}: {counts}'
+    else:
+      failures.append((path, error))
+      message = f'[{done}/{len(paths)}] {os.path.basename(path)}: FAILED ({error})'
+    if progress is not None:
+      progress(f'{message} ({time.perf_counter() - start:.1f}s)')
+
+  if len(paths) == 1 or workers == 1:
+    for path in paths:
+      try:
+        finished(path, read_workbook(path))
+      except Exception as e:
+        finished(path, error=f'{type(e).__name__}: {e}')
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = {executor.submit(read_workbook, path): path for path in paths}
+      for future in as_completed(futures):
+        try:
+          finished(futures[future], future.result())
+        except Exception as e:
+          finished(futures[future], error=f'{type(e).__name__}: {e}')
+
+  if not results:
+    errors = '; '.join(f'{os.path.basename(path)}: {error}' for path, error in failures)
+    raise ValueError(f'none of the {len(paths)} workbooks in {source} could be read ({errors})')
+
+  # concatenate once per frame, files in name order
+  rules = rules or {}
+  frames = {}
+  for name in SHEETS:
+    parts = [harmonize(results[path][name], rules.get(name, {}).get('rename')) for path in paths if name in results.get(path, {})]
+    if parts:
+      frames[name] = pd.concat(parts, ignore_index=True)
+  return frames, failures
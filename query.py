@@ -0,0 +1,285 @@
+import numpy as np
+import pandas as pd
+
+# ----- PROJECT QUERIES -----
+# filter proj_data without copying it:
+# every filterable column is factorized once into integer category codes (ProjectIndex),
+# a query is a tree of predicates evaluated to a boolean mask over those codes,
+# and the aggregations take the mask instead of a filtered sub-frame
+#
+#   index = ProjectIndex(proj_data)
+#   mask = index.mask(funding_type('Base Grant (104b)') & years(2021, 2022) & ~institution('Loyola University'))
+#   index.group_totals('WRRI Science Priority', mask)
+#
+# masks of predicates are memoised on the index, so re-using a predicate in many combinations only evaluates it once
+
+# columns that can be filtered and grouped on
+CATEGORY_COLUMNS = ['Funding Type', 'PI Affiliated Organization', 'WRRI Science Priority']
+
+# the three focus category columns are searched together, a project matches if any of them matches
+FOCUS_COLUMNS = ['Focus Category 1', 'Focus Category 2', 'Focus Category 3']
+
+
+# ----- PREDICATES -----
+# a predicate knows how to turn itself into a mask over a ProjectIndex (or anything with the same isin_mask/years)
+# key identifies the predicate, equal keys always give equal masks
+# columns is the set of columns the predicate looks at
+class Predicate:
+  key = None
+  columns = frozenset()
+
+  def evaluate(self, index):
+    raise NotImplementedError
+
+  def __and__(self, other):
+    return Combined('and', self, other)
+
+  def __or__(self, other):
+    return Combined('or', self, other)
+
+  def __invert__(self):
+    return Not(self)
+
+  def __repr__(self):
+    return f'{type(self).__name__}{self.key[1:]}'
+
+# rows where column is one of values
+class IsIn(Predicate):
+  def __init__(self, column, values):
+    self.column = column
+    self.values = frozenset(values)
+    self.key = ('isin', column, self.values)
+    self.columns = frozenset([column])
+
+  def evaluate(self, index):
+    return index.isin_mask(self.column, self.values)
+
+# rows where any of the focus category columns is one of values
+class FocusIn(Predicate):
+  def __init__(self, values):
+    self.values = frozenset(values)
+    self.key = ('focus', self.values)
+    self.columns = frozenset(FOCUS_COLUMNS)
+
+  def evaluate(self, index):
+    return index.isin_mask(FOCUS_COLUMNS, self.values).any(axis=1)
+
+# rows whose project year is between start and end, inclusive (either end can be None for an open range)
+class YearRange(Predicate):
+  def __init__(self, start=None, end=None):
+    self.start = start
+    self.end = end
+    self.key = ('years', start, end)
+    self.columns = frozenset(['Project Year'])
+
+  def evaluate(self, index):
+    mask = ~np.isnan(index.years)
+    if self.start is not None:
+      mask &= index.years >= self.start
+    if self.end is not None:
+      mask &= index.years <= self.end
+    return mask
+
+# rows whose project matches a keyword query on the text index (see search.py), e.g. 'pfas OR stormwater'
+class Keywords(Predicate):
+  def __init__(self, text):
+    self.text = ' '.join(text.split())
+    self.key = ('keywords', self.text)
+    self.columns = frozenset(['Keywords'])
+
+  def evaluate(self, index):
+    return index.keyword_mask(self.text)
+
+class Combined(Predicate):
+  def __init__(self, op, left, right):
+    self.op = op
+    self.left = left
+    self.right = right
+    self.key = (op, left.key, right.key)
+    self.columns = left.columns | right.columns
+
+  def evaluate(self, index):
+    if self.op == 'and':
+      return index.mask(self.left) & index.mask(self.right)
+    return index.mask(self.left) | index.mask(self.right)
+
+  def __repr__(self):
+    return f'({self.left!r} {self.op} {self.right!r})'
+
+class Not(Predicate):
+  def __init__(self, inner):
+    self.inner = inner
+    self.key = ('not', inner.key)
+    self.columns = inner.columns
+
+  def evaluate(self, index):
+    return ~index.mask(self.inner)
+
+  def __repr__(self):
+    return f'~{self.inner!r}'
+
+# utility functions to build the predicates, each takes one or more accepted values
+def funding_type(*values):
+  return IsIn('Funding Type', values)
+
+def institution(*values):
+  return IsIn('PI Affiliated Organization', values)
+
+def priority(*values):
+  return IsIn('WRRI Science Priority', values)
+
+def focus_category(*values):
+  return FocusIn(v.upper().strip() for v in values)
+
+def years(start=None, end=None):
+  return YearRange(start, end)
+
+def keywords(text):
+  return Keywords(text)
+
+# parameter name -> column, for from_params
+PARAM_COLUMNS = {
+  'funding_type': 'Funding Type',
+  'institution': 'PI Affiliated Organization',
+  'priority': 'WRRI Science Priority',
+}
+PARAMS = list(PARAM_COLUMNS) + ['focus_category', 'year_from', 'year_to', 'q']
+
+# turn (name, value) string pairs, e.g. parsed from a query string, into one predicate
+# repeating a name accepts any of its values, different names must all match
+# (except q, a keyword query: repeated q's must all match)
+# returns None when there are no pairs (no filtering)
+def from_params(params):
+  values = {}
+  for name, value in params:
+    if name not in PARAMS:
+      raise ValueError(f'unknown filter: {name}')
+    values.setdefault(name, []).append(value)
+
+  predicates = []
+  for name, column in PARAM_COLUMNS.items():
+    if name in values:
+      predicates.append(IsIn(column, values[name]))
+  if 'focus_category' in values:
+    predicates.append(focus_category(*values['focus_category']))
+  if 'year_from' in values or 'year_to' in values:
+    for name in ('year_from', 'year_to'):
+      if not all(v.isdigit() for v in values.get(name, [])):
+        raise ValueError(f'{name} must be a year')
+    year_from = max(int(v) for v in values['year_from']) if 'year_from' in values else None
+    year_to = min(int(v) for v in values['year_to']) if 'year_to' in values else None
+    predicates.append(YearRange(year_from, year_to))
+  for text in values.get('q', []):
+    if not text.split():
+      raise ValueError('q must not be empty')
+    predicates.append(Keywords(text))
+
+  if not predicates:
+    return None
+  predicate = predicates[0]
+  for other in predicates[1:]:
+    predicate = predicate & other
+  return predicate
+
+
+# ----- INDEX -----
+# (codes, sorted categories) of a column
+# categorical columns with sorted categories (see rules.canonicalize) already have them
+def factorize(column):
+  if isinstance(column.dtype, pd.CategoricalDtype) and column.cat.categories.is_monotonic_increasing:
+    return column.cat.codes.to_numpy(), pd.Index(column.cat.categories)
+  return pd.factorize(column, sort=True)
+
+# mask of codes referring to one of values in categories
+# looks the values up once in the categories and then maps every code through a boolean table
+def isin_codes(codes, categories, values):
+  positions = categories.get_indexer(list(values))
+  # one extra slot at the end, so code -1 (missing) maps to False
+  table = np.zeros(len(categories) + 1, dtype=bool)
+  table[positions[positions >= 0]] = True
+  return table[codes]
+
+class ProjectIndex:
+  # text: optional search.TextIndex over the projects' titles, citations and award descriptions (for keyword queries)
+  # prod_data / award_data: optional products and awards frames, for the figures that look at them (e.g. the trends)
+  def __init__(self, proj_data, text=None, prod_data=None, award_data=None):
+    self.proj_data = proj_data
+    self.size = len(proj_data)
+    self.text = text
+    self.prod_data = prod_data
+    self.award_data = award_data
+
+    # column -> (codes, categories), a code of -1 is a missing value
+    self.codes = {}
+    for col in CATEGORY_COLUMNS:
+      self.codes[col] = factorize(proj_data[col])
+
+    # the focus columns share one vocabulary, codes has one column per focus column
+    codes, categories = pd.factorize(proj_data[FOCUS_COLUMNS].to_numpy().ravel(), sort=True)
+    self.codes[tuple(FOCUS_COLUMNS)] = (codes.reshape(self.size, len(FOCUS_COLUMNS)), pd.Index(categories))
+
+    self.years = proj_data['Project Year'].to_numpy(dtype=float)
+    # missing amounts count as 0, as in groupby(...).sum(), column_sum and ProjectCube
+    self.amounts = np.nan_to_num(proj_data['Funding Amount'].to_numpy(dtype=float))
+
+    # predicate key -> mask
+    self._masks = {}
+
+  # the (read-only) boolean mask of rows matching predicate
+  def mask(self, predicate):
+    mask = self._masks.get(predicate.key)
+    if mask is None:
+      mask = np.asarray(predicate.evaluate(self), dtype=bool)
+      mask.setflags(write=False)
+      self._masks[predicate.key] = mask
+    return mask
+
+  # mask of rows whose code in column (or list of columns) is one of values
+  def isin_mask(self, column, values):
+    codes, categories = self.codes[column if isinstance(column, str) else tuple(column)]
+    return isin_codes(codes, categories, values)
+
+  # mask of rows whose 'Project ID' matches a keyword query of the text index
+  def keyword_mask(self, text):
+    if self.text is None:
+      raise ValueError('keyword queries need a text index, see search.py')
+    if 'Project ID' not in self.codes:
+      self.codes['Project ID'] = factorize(self.proj_data['Project ID'])
+    return self.isin_mask('Project ID', self.text.search(text))
+
+  # the rows of proj_data matching mask, only for when the rows themselves are needed
+  def rows(self, mask=None):
+    if mask is None:
+      return self.proj_data
+    return self.proj_data[mask]
+
+  # mask over the projects of a mask over the index, the same mask (None for every project), see ProjectCube.project_mask
+  def project_mask(self, mask=None):
+    return mask
+
+  def count(self, mask=None):
+    if mask is None:
+      return self.size
+    return int(np.count_nonzero(mask))
+
+  # sum of a numeric column over the rows in mask, missing values count as 0
+  def column_sum(self, column, mask=None):
+    values = self.proj_data[column].to_numpy(dtype=float)
+    return np.nansum(values, where=True if mask is None else mask)
+
+  # count of projects and sum of 'Funding Amount' for each value of column over the rows in mask
+  # same result as proj_data[mask].groupby(column, as_index=False, dropna=True).agg(...), without building proj_data[mask]
+  def group_totals(self, column, mask=None):
+    codes, categories = self.codes[column]
+    # shift codes by one so missing values land in bin 0, which is dropped
+    weights = None if mask is None else mask.astype(float)
+    counts = np.bincount(codes + 1, weights=weights, minlength=len(categories) + 1)[1:]
+    amounts = self.amounts if mask is None else np.where(mask, self.amounts, 0.0)
+    sums = np.bincount(codes + 1, weights=amounts, minlength=len(categories) + 1)[1:]
+
+    present = counts > 0
+    return pd.DataFrame({
+      column: categories[present],
+      'Project Count': counts[present].astype(np.int64),
+      'Funding Amount': sums[present],
+    })
@@ -0,0 +1,86 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# ----- CLEANING RULES -----
+# how the raw frames are cleaned, read from rules.json:
+#   {
+#     "<frame>": {
+#       "canonicalize": {"<column>": {"strip": true, "collapse_spaces": true, "upper": true, "fold_case": true, "aliases": {"<spelling>": "<canonical>"}}},
+#       "drop": {"<column>": ["<value>", ...]},
+#       "rename": {"<header used by some workbooks>": "<column>"}
+#     },
+#     "figures": {"exclude_institutions": ["<institution>", ...]}
+#   }
+# frames are "projects", "products" and "awards"
+#
+# canonicalize steps, applied in this order:
+#   strip           - remove leading / trailing whitespace
+#   collapse_spaces - turn runs of whitespace into one space
+#   upper           - upper case
+#   fold_case       - spellings that only differ in case become the spelling used by the most rows
+#   aliases         - replace whole values
+# drop removes the rows whose column has one of the listed values (after canonicalize)
+# rename is applied by ingest.py to the headers of every workbook before they are merged
+#
+# the steps run on the distinct values of a column, not on its rows:
+# the column is factorized once, the distinct values are rewritten, and the rows only get their codes remapped
+# canonicalized columns come back as categoricals with sorted categories
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+def load_rules(path=RULES_FILE):
+  with open(path, encoding='utf-8') as f:
+    return json.load(f)
+
+# rewrite the distinct values of series with rule and return it as a categorical series
+def canonicalize(series, rule):
+  codes, uniques = pd.factorize(series)
+  if len(uniques) == 0:
+    # nothing but missing values
+    return pd.Series(pd.Categorical.from_codes(codes, pd.Index([], dtype=object)), index=series.index, name=series.name)
+  # as text, so a number in a category column (e.g. a focus category of 5) is a spelling like any other
+  values = pd.Series(np.asarray(uniques, dtype=object), dtype=object).astype(str)
+
+  if rule.get('strip'):
+    values = values.str.strip()
+  if rule.get('collapse_spaces'):
+    values = values.str.split().str.join(' ')
+  if rule.get('upper'):
+    values = values.str.upper()
+  if rule.get('fold_case'):
+    # number of rows using each distinct value
+    rows = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    spellings = pd.DataFrame({'key': values.str.casefold(), 'value': values, 'rows': rows})
+    totals = spellings.groupby(['key', 'value'], sort=False)['rows'].sum().reset_index()
+    preferred = totals.loc[totals.groupby('key', sort=False)['rows'].idxmax()].set_index('key')['value']
+    values = spellings['key'].map(preferred)
+  if rule.get('aliases'):
+    values = values.replace(rule['aliases'])
+
+  # merge the values that are now equal, sorted so the codes follow the order groupby would use
+  # values an alias maps to null become missing
+  present = values.notna().to_numpy()
+  categories, present_codes = np.unique(values[present].to_numpy(dtype=object), return_inverse=True)
+  value_codes = np.full(len(values), -1)
+  value_codes[present] = present_codes
+  row_codes = np.where(codes < 0, -1, value_codes[np.maximum(codes, 0)])
+  return pd.Series(pd.Categorical.from_codes(row_codes, categories), index=series.index, name=series.name)
+
+# canonicalize the columns of frame and drop its excluded rows, following rules[name]
+def apply_rules(rules, name, frame):
+  frame_rules = rules.get(name, {})
+
+  canonical = {col: canonicalize(frame[col], rule) for col, rule in frame_rules.get('canonicalize', {}).items() if col in frame.columns}
+  if canonical:
+    frame = frame.assign(**canonical)
+
+  drop = np.zeros(len(frame), dtype=bool)
+  for col, values in frame_rules.get('drop', {}).items():
+    drop |= frame[col].isin(values).to_numpy()
+  if drop.any():
+    frame = frame[~drop]
+
+  return frame
@@ -0,0 +1,128 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from atomic import write_atomic
+
+# ----- KEYWORD SEARCH -----
+# inverted index from words to the projects whose title, product citations or award descriptions use them,
+# built once when the data is loaded (and cached next to it, see load_or_build)
+#
+#   text = TextIndex.build(proj_data, prod_data, award_data)
+#   text.search('pfas OR stormwater')        # array of 'Project ID's
+#   text.search('harmful algal blooms')      # projects using all three words
+#
+# queries: words are ANDed, 'OR' (upper case) separates alternatives, 'AND' may be written out, e.g.
+#   'harmful algal blooms OR pfas AND groundwater'
+# words are matched whole (no phrases or prefixes), after lower casing and dropping a plural 's'
+# the matching projects drive the figures through query.keywords, e.g. index.mask(query.keywords('pfas'))
+
+# (frame, column) pairs that are indexed, frames are 'projects', 'products' and 'awards'
+TEXT_COLUMNS = [('projects', 'Project Title'), ('products', 'Product Citation'), ('awards', 'Award Description')]
+
+WORD = r'[a-z0-9]+'
+
+# a trailing 's' after at least 3 letters, not 'ss' ('blooms' -> 'bloom', 'glass' stays)
+PLURAL = r'(?<=[a-z0-9]{2}[a-rt-z0-9])s$'
+
+# bump when the index format or the tokenizer changes, so cached indexes are rebuilt
+INDEX_VERSION = 1
+
+# lower case words of every text in series, as a series of words indexed like series (one row per word)
+def tokenize(series):
+  words = series.astype(str).str.lower().str.findall(WORD).explode().dropna()
+  return words.str.replace(PLURAL, '', regex=True)
+
+# query string -> list of alternatives, each a list of words that must all match
+def parse_query(text):
+  alternatives = []
+  for part in text.split(' OR '):
+    words = list(tokenize(pd.Series([part.replace(' AND ', ' ')])))
+    if words:
+      alternatives.append(words)
+  if not alternatives:
+    raise ValueError(f'no words to search for in {text!r}')
+  return alternatives
+
+class TextIndex:
+  # tokens: sorted unique words, project_ids: sorted unique 'Project ID's
+  # the projects using tokens[i] are project_ids[postings[offsets[i]:offsets[i + 1]]] (sorted)
+  def __init__(self, tokens, offsets, postings, project_ids):
+    self.tokens = pd.Index(tokens)
+    self.offsets = offsets
+    self.postings = postings
+    self.project_ids = np.asarray(project_ids, dtype=object)
+
+  # index the TEXT_COLUMNS of the projects, products and awards frames
+  @classmethod
+  def build(cls, proj_data, prod_data, award_data):
+    frames = {'projects': proj_data, 'products': prod_data, 'awards': award_data}
+    texts = pd.concat([
+      frames[name][['Project ID', col]].set_axis(['Project ID', 'text'], axis=1)
+      for name, col in TEXT_COLUMNS if col in frames[name].columns
+    ], ignore_index=True).dropna().reset_index(drop=True)
+
+    words = tokenize(texts['text'])
+    token_codes, tokens = pd.factorize(words.to_numpy(dtype=object), sort=True)
+    id_codes, project_ids = pd.factorize(texts['Project ID'].to_numpy(dtype=object)[words.index], sort=True)
+
+    # distinct (token, project) pairs, sorted by token and then project
+    pairs = np.unique(token_codes.astype(np.int64) * len(project_ids) + id_codes)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(pairs // len(project_ids), minlength=len(tokens)))])
+    return cls(tokens, offsets, (pairs % len(project_ids)).astype(np.int32), project_ids)
+
+  # sorted codes (into project_ids) of the projects using word (already tokenized)
+  def _postings(self, word):
+    i = self.tokens.get_indexer([word])[0]
+    if i < 0:
+      return np.empty(0, dtype=np.int32)
+    return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+  # sorted codes of the projects matching a query string
+  def search_codes(self, text):
+    found = np.empty(0, dtype=np.int32)
+    for words in parse_query(text):
+      codes = self._postings(words[0])
+      for word in words[1:]:
+        codes = np.intersect1d(codes, self._postings(word), assume_unique=True)
+      found = np.union1d(found, codes)
+    return found
+
+  # array of the 'Project ID's matching a query string
+  def search(self, text):
+    return self.project_ids[self.search_codes(text)]
+
+  # written atomically, so processes loading it at the same time never see half of it
+  def save(self, path, key=''):
+    write_atomic(path, lambda f: np.savez(f, key=np.array(key), tokens=np.asarray(self.tokens, dtype=str), offsets=self.offsets,
+                                          postings=self.postings, project_ids=self.project_ids.astype(str)))
+
+  # the index saved at path, or None if it is missing or was saved under another key
+  @classmethod
+  def load(cls, path, key=''):
+    if not os.path.exists(path):
+      return None
+    with np.load(path) as saved:
+      if str(saved['key']) != key:
+        return None
+      return cls(saved['tokens'].astype(object), saved['offsets'], saved['postings'], saved['project_ids'])
+
+# key of a cached index: hash of the source files, the cleaning rules (as text) and INDEX_VERSION
+def dataset_key(paths, *extra):
+  digest = hashlib.sha1(f'{INDEX_VERSION}'.encode())
+  for path in paths:
+    with open(path, 'rb') as f:
+      digest.update(f.read())
+  for value in extra:
+    digest.update(str(value).encode())
+  return digest.hexdigest()
+
+# the index cached at path if it was built from the same data (key), otherwise build it from the frames and cache it
+def load_or_build(path, key, proj_data, prod_data, award_data):
+  text = TextIndex.load(path, key)
+  if text is None:
+    text = TextIndex.build(proj_data, prod_data, award_data)
+    text.save(path, key)
+  return text
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import datavis
+import figures
+import query
+
+# ----- HTTP FIGURE SERVICE -----
+# serves the figures in datavis.FIGURES over HTTP so the dashboard doesn't need the PNGs in saved_figs/
+#   GET /figures                          -> JSON list of figure names and formats
+#   GET /figures/<name>.<format>?filters  -> the rendered figure
+# filters are the query parameters understood by query.from_params, e.g.
+#   /figures/funding_visualizations.png?institution=Loyola University&year_from=2021
+#   /figures/institution_visualizations.png?q=pfas OR stormwater   (keyword query, see search.py)
+# figures are rendered in a worker pool (off the event loop) and the bytes are kept in a size-bounded LRU cache
+# every response carries an ETag, a request with a matching If-None-Match gets a 304 with no body
+
+# formats matplotlib can write -> content type of the response
+FORMATS = {
+  'png': 'image/png',
+  'svg': 'image/svg+xml',
+  'pdf': 'application/pdf',
+}
+
+STATUS_TEXT = {
+  200: 'OK',
+  304: 'Not Modified',
+  400: 'Bad Request',
+  404: 'Not Found',
+  405: 'Method Not Allowed',
+  500: 'Internal Server Error',
+}
+
+
+# ----- WORKER SIDE -----
+# every worker keeps its own copy of the cleaned frames, their ProjectIndex and ProjectCube, loaded once when the worker starts
+_frames = {}
+
+def init_worker(data_dir=datavis.DATA_DIR):
+  proj_data, prod_data, award_data = datavis.load_data(data_dir)
+  _frames['proj_data'] = proj_data
+  _frames['prod_data'] = prod_data
+  _frames['award_data'] = award_data
+  _frames['index'] = query.ProjectIndex(proj_data, text=datavis.load_text_index(data_dir, proj_data, prod_data, award_data),
+                                        prod_data=prod_data, award_data=award_data)
+  _frames['cube'] = datavis.build_cube(_frames['index'])
+
+# runs in a worker: draw one figure and return its encoded bytes
+# filters is a tuple of (param, value) pairs so it can be part of a cache key
+def render_figure(name, filters, fmt):
+  # reduce the cube when the filters are on its dimensions, fall back to masking the projects otherwise
+  source = _frames['cube']
+  predicate = query.from_params(filters)
+  if predicate is not None and not source.can_answer(predicate):
+    source = _frames['index']
+  mask = None if predicate is None else source.mask(predicate)
+  fig = datavis.make_figure(name, source, mask)
+  try:
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    return buf.getvalue()
+  finally:
+    figures.release(fig)
+
+
+# ----- FIGURE CACHE -----
+# least recently used cache of rendered figures, bounded by the total size of the cached bytes
+# key -> (etag, body)
+class FigureCache:
+  def __init__(self, max_bytes=64 * 1024 * 1024):
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict()
+
+  def get(self, key):
+    entry = self._entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self._entries.move_to_end(key)
+    self.hits += 1
+    return entry
+
+  def put(self, key, body):
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    if len(body) > self.max_bytes:
+      # too big to ever fit, hand it back without caching it
+      return etag, body
+
+    old = self._entries.pop(key, None)
+    if old is not None:
+      self.size -= len(old[1])
+    self._entries[key] = (etag, body)
+    self.size += len(body)
+
+    # evict least recently used entries until the cache fits again
+    while self.size > self.max_bytes:
+      _, (_, evicted) = self._entries.popitem(last=False)
+      self.size -= len(evicted)
+
+    return etag, body
+
+  def __len__(self):
+    return len(self._entries)
+
+
+# ----- APPLICATION -----
+class Response:
+  def __init__(self, status, headers=None, body=b''):
+    self.status = status
+    self.headers = headers or {}
+    self.body = body
+
+  def __repr__(self):
+    return f'<Response {self.status} {len(self.body)} bytes>'
+
+def error_response(status, message):
+  return Response(status, {'Content-Type': 'text/plain; charset=utf-8'}, message.encode('utf-8'))
+
+class FigureService:
+  def __init__(self, executor, cache=None):
+    self.executor = executor
+    self.cache = cache if cache is not None else FigureCache()
+    # renders in progress, so concurrent requests for the same figure share one render
+    self._pending = {}
+
+  async def get_figure(self, name, filters, fmt):
+    key = (name, filters, fmt)
+    entry = self.cache.get(key)
+    if entry is not None:
+      return entry
+
+    pending = self._pending.get(key)
+    if pending is None:
+      pending = asyncio.ensure_future(self._render(key))
+      self._pending[key] = pending
+    # shielded so a client disconnecting doesn't cancel the render for everyone else waiting on it
+    return await asyncio.shield(pending)
+
+  async def _render(self, key):
+    loop = asyncio.get_running_loop()
+    try:
+      body = await loop.run_in_executor(self.executor, render_figure, *key)
+      return self.cache.put(key, body)
+    finally:
+      del self._pending[key]
+
+  # handle one request, independent of the transport
+  # headers is a dict with lower-case names
+  async def handle(self, method, target, headers):
+    if method not in ('GET', 'HEAD'):
+      return error_response(405, 'only GET and HEAD are supported')
+
+    url = urlsplit(target)
+    path = unquote(url.path).rstrip('/')
+
+    if path == '/figures':
+      body = json.dumps({'figures': sorted(datavis.FIGURES), 'formats': sorted(FORMATS)}).encode('utf-8')
+      return Response(200, {'Content-Type': 'application/json'}, body)
+
+    if not path.startswith('/figures/'):
+      return error_response(404, f'no such path: {path}')
+
+    name, _, fmt = path[len('/figures/'):].rpartition('.')
+    if name not in datavis.FIGURES:
+      return error_response(404, f'no such figure: {name}')
+    if fmt not in FORMATS:
+      return error_response(404, f'unsupported format: {fmt}')
+
+    filters = tuple(sorted(parse_qsl(url.query)))
+    try:
+      query.from_params(filters)
+    except ValueError as e:
+      return error_response(400, str(e))
+
+    try:
+      etag, body = await self.get_figure(name, filters, fmt)
+    except Exception as e:
+      return error_response(500, f'failed to render {name}: {e}')
+
+    response_headers = {
+      'Content-Type': FORMATS[fmt],
+      'ETag': etag,
+      'Cache-Control': 'no-cache',
+    }
+    if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+      return Response(304, response_headers)
+    return Response(200, response_headers, body)
+
+
+# ----- HTTP TRANSPORT -----
+async def handle_connection(service, reader, writer):
+  try:
+    while True:
+      request_line = await reader.readline()
+      if not request_line.strip():
+        break
+      try:
+        method, target, version = request_line.decode('latin-1').split()
+      except ValueError:
+        break
+
+      headers = {}
+      while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+          break
+        header, _, value = line.decode('latin-1').partition(':')
+        headers[header.strip().lower()] = value.strip()
+
+      response = await service.handle(method, target, headers)
+      # HEAD gets the Content-Length GET would have, without the body
+      body = b'' if method == 'HEAD' or response.status == 304 else response.body
+
+      lines = [f'HTTP/1.1 {response.status} {STATUS_TEXT[response.status]}']
+      for header, value in response.headers.items():
+        lines.append(f'{header}: {value}')
+      lines.append(f'Content-Length: {len(response.body)}')
+      writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+      await writer.drain()
+
+      if version == 'HTTP/1.0' or headers.get('connection', '').lower() == 'close':
+        break
+  except ConnectionError:
+    pass
+  finally:
+    writer.close()
+
+async def serve(service, host, port):
+  server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+  print(f'serving figures on http://{host}:{port}/figures')
+  async with server:
+    await server.serve_forever()
+
+
+# ----- LOCAL CLIENT -----
+# stand-in for an HTTP client: sends requests straight to a FigureService without opening a socket
+#   with LocalClient() as client:
+#     first = client.get('/figures/funding_visualizations.png')
+#     again = client.get('/figures/funding_visualizations.png', {'If-None-Match': first.headers['ETag']})
+#     assert again.status == 304
+class LocalClient:
+  def __init__(self, service=None, data_dir=datavis.DATA_DIR):
+    self._own_executor = service is None
+    if service is None:
+      service = FigureService(ThreadPoolExecutor(max_workers=1, initializer=init_worker, initargs=(data_dir,)))
+    self.service = service
+    self._loop = asyncio.new_event_loop()
+
+  def get(self, target, headers=None):
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    return self._loop.run_until_complete(self.service.handle('GET', target, headers))
+
+  def close(self):
+    self._loop.close()
+    if self._own_executor:
+      self.service.executor.shutdown()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Serve the datavis figures over HTTP.')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--data-dir', default=datavis.DATA_DIR)
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+  parser.add_argument('--cache-mb', type=float, default=64, help='size limit of the rendered figure cache')
+  args = parser.parse_args()
+
+  # a process pool, since pyplot is not safe to use from several threads at once
+  executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.data_dir,))
+  service = FigureService(executor, FigureCache(int(args.cache_mb * 1024 * 1024)))
+  try:
+    asyncio.run(serve(service, args.host, args.port))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    executor.shutdown()
+
+
+if __name__ == '__main__':
+  main()
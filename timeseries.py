@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from validate import MONTHS
+
+# ----- TIME SERIES -----
+# year / month columns turned into integer period codes in one vectorized pass, and totals binned into dense arrays
+#   monthly code = year * 12 + month - 1, yearly code = year, -1 where the year (or month) is missing
+# month names are looked up once per distinct value (a table indexed by their factorized codes), never parsed per row
+#
+#   codes = month_periods(award_data['Year Awarded'], award_data['Month Awarded'])
+#   start, amounts = bin_periods(codes, award_data['Monetary Benefit of Award'])
+#   rolling_sum(amounts, 12)                   # 12-month rolling sums
+#   period_labels(start, len(amounts), 'M')    # '2021-12', '2022-01', ...
+#
+# the arrays have one slot per period between the first and the last, empty periods are 0,
+# so decades of monthly data are a few hundred slots no matter how many rows there are
+
+# lower case month name or abbreviation -> month number
+MONTH_NUMBERS = {}
+for number, month in enumerate(MONTHS, 1):
+  MONTH_NUMBERS[month.casefold()] = number
+  MONTH_NUMBERS[month[:3].casefold()] = number
+
+# month number (1 - 12) of every month name in months, 0 where it is missing or not a month
+def month_numbers(months):
+  codes, names = pd.factorize(pd.Series(months))
+  # one extra slot at the end, so code -1 (missing) maps to 0
+  table = np.array([MONTH_NUMBERS.get(str(name).strip().casefold(), 0) for name in names] + [0], dtype=np.int64)
+  return table[codes]
+
+# yearly period codes of a numeric year column (e.g. 2022.0)
+def year_periods(years):
+  years = pd.to_numeric(pd.Series(years), errors='coerce').to_numpy(dtype=float)
+  return np.where(np.isnan(years), -1, np.nan_to_num(years)).astype(np.int64)
+
+# monthly period codes of a year and a month name column
+def month_periods(years, months):
+  years = year_periods(years)
+  months = month_numbers(months)
+  return np.where((years >= 0) & (months > 0), years * 12 + months - 1, -1)
+
+# (start, totals): totals[i] is the sum of weights (or the count of rows) with code start + i
+# start / stop default to the first / one past the last code present, codes outside them (and -1) are left out
+def bin_periods(codes, weights=None, start=None, stop=None):
+  codes = np.asarray(codes)
+  valid = codes >= 0
+  if start is None:
+    start = int(codes[valid].min()) if valid.any() else 0
+  if stop is None:
+    stop = int(codes[valid].max()) + 1 if valid.any() else start
+  keep = valid & (codes >= start) & (codes < stop)
+  if weights is not None:
+    weights = np.nan_to_num(pd.to_numeric(pd.Series(weights), errors='coerce').to_numpy(dtype=float))[keep]
+  return start, np.bincount(codes[keep] - start, weights=weights, minlength=stop - start)
+
+# sum of the last window values at every position (fewer at the start)
+def rolling_sum(values, window):
+  totals = np.cumsum(values, dtype=float)
+  totals[window:] -= totals[:-window].copy()
+  return totals
+
+# labels of length periods from start, freq 'M' ('2022-01') or 'Y' ('2022')
+def period_labels(start, length, freq):
+  if freq == 'M':
+    codes = start + np.arange(length)
+    return [f'{year}-{month:02d}' for year, month in zip(codes // 12, codes % 12 + 1)]
+  return [str(year) for year in range(start, start + length)]
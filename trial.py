@@ -1,9 +1,17 @@
+import os
 import textwrap
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import matplotlib.cm as cm
 import numpy as np
+from datavis import read_data, top_k
+from figures import new_figure, release
+
+# most categories drawn in one bar / pie chart, the rest are folded into an "Other" bar / slice
+# (the full counts are written to summaries/ with the figures)
+MAX_BARS = 19
+MAX_SLICES = 9
 
 # utility function to clean currency strings
 def clean_currency(x):
@@ -13,9 +21,7 @@ def clean_currency(x):
   return float(x)
 
 
-proj_data = pd.read_csv('data\sample_projects.csv')
-prod_data = pd.read_csv('data\sample_products.csv')
-award_data = pd.read_csv('data\sample_awards.csv')
+proj_data, prod_data, award_data = read_data()
 
 # clean funding amount column from proj_data
 proj_data['Funding Amount'] = proj_data['Funding Amount'].apply(clean_currency)
@@ -61,6 +67,13 @@ cat_data = pd.DataFrame({
   'Count': category_counts.values
 })
 
+# the largest categories for the Category Usage chart, percentages are still of all uses
+cat_top = top_k(category_counts, MAX_BARS)
+cat_plot_data = pd.DataFrame({
+  'Category': cat_top.index,
+  'Count': cat_top.values
+})
+
 # ----- FUNDING VISUALIZATIONS -----
 # Subplots (from proj_data):
 # 1. bar chart, 'Funding Type' vs. # of projects
@@ -73,7 +86,7 @@ cat_data = pd.DataFrame({
 # Figure arrangement:
 # 2 rows, 2 columns (first two subplots on top row, third subplot on bottom left, additional info on bottom right)
 
-funding_fig = plt.figure(figsize=(12, 8))
+funding_fig = new_figure(figsize=(12, 8))
 
 # Subplot 1: Funding Type vs. Project Count
 # sort by project count descending
@@ -143,8 +156,9 @@ ax4 = funding_fig.add_subplot(2, 2, 4)
 ax4.axis('off')
 ax4.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
 
-plt.tight_layout()
+funding_fig.tight_layout()
 funding_fig.savefig('saved_figs/funding_visualizations.png')
+release(funding_fig)
 
 
 # ----- STUDENT VISUALIZATIONS -----
@@ -156,7 +170,7 @@ funding_fig.savefig('saved_figs/funding_visualizations.png')
 # Figure arrangement:
 # 1 row, 2 columns (first subplot on left, additional info on right)
 
-student_fig = plt.figure(figsize=(10, 5))
+student_fig = new_figure(figsize=(10, 5))
 # Subplot 1: Student Type vs. Student Count
 ax1 = student_fig.add_subplot(1, 2, 1)
 ax1.bar(stu_data['Student Type'], stu_data['Student Count'])
@@ -177,8 +191,9 @@ ax2 = student_fig.add_subplot(1, 2, 2)
 ax2.axis('off')
 ax2.text(0.1, 0.5, info_text, fontsize=12, verticalalignment='center')
 
-plt.tight_layout()
+student_fig.tight_layout()
 student_fig.savefig('saved_figs/student_visualizations.png')
+release(student_fig)
 
 
 # ----- CATEGORY VISUALIZATIONS PT. 1 -----
@@ -189,7 +204,7 @@ student_fig.savefig('saved_figs/student_visualizations.png')
 # Figure arrangement:
 # 1 row, 3 columns (first subplot on left, nothing in middle, second subplot on right)
 
-cat_bar_fig = plt.figure(figsize=(24, 12))
+cat_bar_fig = new_figure(figsize=(24, 12))
 gs = cat_bar_fig.add_gridspec(1, 2, width_ratios=[3, 2])
 
 # Subplot 1: Category vs. Count
@@ -197,15 +212,16 @@ gs = cat_bar_fig.add_gridspec(1, 2, width_ratios=[3, 2])
 # y label: # of Projects Using Category
 # each category represented by a different color
 # put percentage on top of each bar
+# only the MAX_BARS most used categories get a bar, the rest share one "Other" bar
 ax1 = cat_bar_fig.add_subplot(gs[0, 0])
-colors1 = plt.get_cmap('tab20', len(cat_data))(range(len(cat_data)))
-bars1 = ax1.bar(cat_data['Category'], cat_data['Count'], color=colors1)
+colors1 = plt.get_cmap('tab20', len(cat_plot_data))(range(len(cat_plot_data)))
+bars1 = ax1.bar(cat_plot_data['Category'], cat_plot_data['Count'], color=colors1)
 ax1.set_title('Category Usage')
 ax1.set_ylabel('# of Projects Using Category')
 ax1.set_xticks([])
 ax1.margins(x=0.01)
-ax1.legend(bars1, cat_data['Category'], title='Categories (for Category Usage)', loc='upper right')
-for i, v in enumerate(cat_data['Count']):
+ax1.legend(bars1, cat_plot_data['Category'], title='Categories (for Category Usage)', loc='upper right')
+for i, v in enumerate(cat_plot_data['Count']):
   percentage = (v / cat_data['Count'].sum()) * 100
   ax1.text(i, v + 0.125, f'{percentage:.1f}%', ha='center', va='bottom')
 
@@ -228,8 +244,9 @@ for i, v in enumerate(wrri_counts.values):
   percentage = (v / wrri_counts.sum()) * 100
   ax2.text(i, v - 0.25, f'{percentage:.1f}%', ha='center', va='top')
 
-plt.tight_layout()
+cat_bar_fig.tight_layout()
 cat_bar_fig.savefig('saved_figs/category_bar_visualizations.png')
+release(cat_bar_fig)
 
 # ----- CATEGORY VISUALIZATIONS PT. 2 -----
 # Subplots (from proj_data):
@@ -237,36 +254,45 @@ cat_bar_fig.savefig('saved_figs/category_bar_visualizations.png')
 # 2. pie chart, distribution of 'Focus Category 1' values
 # 3. pie chart, distribution of 'Focus Category 2' values
 # 4. pie chart, distribution of 'Focus Category 3' values
+# each pie shows the MAX_SLICES largest values and one "Other" slice for the rest
 # Figure arrangement:
 # 2 rows, 2 columns (first subplot on top left, remaining subplots filling the rest of the grid)
 
-cat_pie_fig = plt.figure(figsize=(12, 10))
+cat_pie_fig = new_figure(figsize=(12, 10))
 
 # Subplot 3: Pie chart of WRRI Science Priority distribution
 ax1 = cat_pie_fig.add_subplot(2, 2, 1)
-ax1.pie(wrri_counts.values, labels=wrri_counts.index, autopct='%1.1f%%')
+wrri_pie_counts = top_k(wrri_counts, MAX_SLICES)
+ax1.pie(wrri_pie_counts.values, labels=wrri_pie_counts.index, autopct='%1.1f%%')
 ax1.set_title('Distribution of WRRI Science Priorities')
 
 # Subplot 4: Pie chart of Focus Category 1 distribution
-focus_cat1_counts = proj_data['Focus Category 1'].value_counts()
+focus_cat1_counts = top_k(proj_data['Focus Category 1'].value_counts(), MAX_SLICES)
 ax2 = cat_pie_fig.add_subplot(2, 2, 2)
 ax2.pie(focus_cat1_counts.values, labels=focus_cat1_counts.index, autopct='%1.1f%%')
 ax2.set_title('Distribution of Focus Category 1')
 
 # Subplot 5: Pie chart of Focus Category 2 distribution
-focus_cat2_counts = proj_data['Focus Category 2'].value_counts()
+focus_cat2_counts = top_k(proj_data['Focus Category 2'].value_counts(), MAX_SLICES)
 ax3 = cat_pie_fig.add_subplot(2, 2, 3)
 ax3.pie(focus_cat2_counts.values, labels=focus_cat2_counts.index, autopct='%1.1f%%')
 ax3.set_title('Distribution of Focus Category 2')
 
 # Subplot 6: Pie chart of Focus Category 3 distribution
-focus_cat3_counts = proj_data['Focus Category 3'].value_counts()
+focus_cat3_counts = top_k(proj_data['Focus Category 3'].value_counts(), MAX_SLICES)
 ax4 = cat_pie_fig.add_subplot(2, 2, 4)
 ax4.pie(focus_cat3_counts.values, labels=focus_cat3_counts.index, autopct='%1.1f%%')
 ax4.set_title('Distribution of Focus Category 3')
 
-plt.tight_layout()
+cat_pie_fig.tight_layout()
 cat_pie_fig.savefig('saved_figs/category_pie_visualizations.png')
+release(cat_pie_fig)
+
+# full distributions behind the category charts, including the categories folded into "Other"
+os.makedirs('summaries', exist_ok=True)
+cat_data.to_csv('summaries/category_counts.csv', index=False)
+pd.concat({col: proj_data[col].value_counts() for col in ['WRRI Science Priority', 'Focus Category 1', 'Focus Category 2', 'Focus Category 3']},
+          names=['Column', 'Value']).rename('Count').reset_index().to_csv('summaries/category_distributions.csv', index=False)
 
 # ----- PRODUCT VISUALIZATIONS -----
 # Subplots (from prod_data):
@@ -0,0 +1,320 @@
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from ingest import SOURCE_COLUMN
+
+# ----- DATA VALIDATION -----
+# checks the raw projects / products / awards frames (as read from csv, before cleaning)
+# every check works on whole columns (or on the distinct values of a column), never row by row
+# each problem found is an issue with a severity:
+#   error   - the figures would be wrong or the cleaning would fail, rendering is aborted
+#   warning - the data is inconsistent and the figures silently carry it
+#   info    - something the cleaning fixes, listed for the record
+
+# columns every frame must have
+REQUIRED_COLUMNS = {
+  'projects': [
+    'Sheet ID', 'Project ID', 'Project Title', 'Funding Type', 'Funding Amount', 'WRRI Science Priority',
+    'Focus Category 1', 'Focus Category 2', 'Focus Category 3', 'Project PIs', 'PI Affiliated Organization',
+    'Undergraduates Supported by WRRA $', 'Masters Students Supported by WRRA $', 'PhD Students Supported by WRRA $',
+    'Postdocs Supported by WRRA $', 'Students Supported by Non-Federal (Matching) Funds',
+  ],
+  'products': ['Sheet ID', 'Project ID', 'Product Type', 'Product Citation', 'Year of Publication', 'Product Stage'],
+  'awards': ['Sheet ID', 'Project ID', 'Award Description', 'Year Awarded', 'Month Awarded', 'Monetary Benefit of Award'],
+}
+
+# columns whose values are categories, spellings that only differ in case / spacing are reported
+CATEGORY_COLUMNS = {
+  'projects': ['Funding Type', 'WRRI Science Priority', 'PI Affiliated Organization', 'Focus Category 1', 'Focus Category 2', 'Focus Category 3'],
+  'products': ['Product Type', 'Product Stage'],
+  'awards': ['Award, Achievement, or Grant', 'Award Source Organization'],
+}
+
+FOCUS_COLUMNS = ['Focus Category 1', 'Focus Category 2', 'Focus Category 3']
+
+MONEY_COLUMNS = {
+  'projects': ['Funding Amount'],
+  'awards': ['Monetary Benefit of Award'],
+}
+
+COUNT_COLUMNS = {
+  'projects': [
+    'Undergraduates Supported by WRRA $', 'Masters Students Supported by WRRA $', 'PhD Students Supported by WRRA $',
+    'Postdocs Supported by WRRA $', 'Students Supported by Non-Federal (Matching) Funds',
+  ],
+  'products': ['Student Co-Authors', 'USGS Staff Co-Authors'],
+}
+
+YEAR_COLUMNS = {
+  'products': ['Year of Publication'],
+  'awards': ['Year Awarded'],
+}
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+
+# how many offending values / ids to list in an issue
+SAMPLE_SIZE = 5
+
+SEVERITIES = ['error', 'warning', 'info']
+
+
+class ValidationError(Exception):
+  def __init__(self, report, issues):
+    self.report = report
+    self.issues = issues
+    super().__init__(f'{len(issues)} data validation problem(s):\n' + '\n'.join(format_issue(issue) for issue in issues))
+
+def format_issue(issue):
+  where = issue['frame'] if issue['column'] is None else f"{issue['frame']}['{issue['column']}']"
+  line = f"{issue['severity'].upper()} {where}: {issue['message']}"
+  if issue['sample']:
+    line += f" (e.g. {', '.join(issue['sample'])})"
+  return line
+
+class ValidationReport:
+  def __init__(self):
+    self.issues = []
+
+  def add(self, severity, frame, check, message, column=None, count=None, sample=None):
+    self.issues.append({
+      'severity': severity,
+      'frame': frame,
+      'check': check,
+      'column': column,
+      'message': message,
+      'count': None if count is None else int(count),
+      'sample': None if sample is None else [str(v) for v in list(sample)[:SAMPLE_SIZE]],
+    })
+
+  @property
+  def errors(self):
+    return [issue for issue in self.issues if issue['severity'] == 'error']
+
+  @property
+  def warnings(self):
+    return [issue for issue in self.issues if issue['severity'] == 'warning']
+
+  # text listing of the issues at or above min_severity
+  def format(self, min_severity='info'):
+    shown = [issue for issue in self.issues if SEVERITIES.index(issue['severity']) <= SEVERITIES.index(min_severity)]
+    return '\n'.join(format_issue(issue) for issue in shown)
+
+  def to_dict(self):
+    return {
+      'errors': len(self.errors),
+      'warnings': len(self.warnings),
+      'issues': self.issues,
+    }
+
+  # raise ValidationError if there are errors (or warnings too, if strict)
+  def raise_for_errors(self, strict=False):
+    failing = self.errors + (self.warnings if strict else [])
+    if failing:
+      raise ValidationError(self, failing)
+
+
+# ----- CHECKS -----
+def check_schema(report, name, frame):
+  missing = [col for col in REQUIRED_COLUMNS[name] if col not in frame.columns]
+  if missing:
+    report.add('error', name, 'schema', 'missing required columns', count=len(missing), sample=missing)
+
+  # a column nobody filled in (read as float by pandas, whatever it should hold)
+  empty = [col for col in REQUIRED_COLUMNS[name] if col in frame.columns and len(frame) and frame[col].isna().all()]
+  if empty:
+    report.add('warning', name, 'schema', 'required columns without any values', count=len(empty), sample=empty)
+
+  # columns pandas named itself because the sheet has no header for them
+  for col in frame.columns[frame.columns.astype(str).str.startswith('Unnamed:')]:
+    filled = frame[col].notna().sum()
+    report.add('warning', name, 'schema', f'column has no header ({filled} non-empty values)', column=col, count=filled, sample=frame[col].dropna().unique())
+
+  return not missing
+
+def check_money(report, name, frame):
+  for col in MONEY_COLUMNS.get(name, []):
+    raw = frame[col]
+    text = raw.astype('string').str.replace(r'[$,\s]', '', regex=True)
+    parsed = pd.to_numeric(text, errors='coerce')
+
+    unparseable = raw.notna() & parsed.isna()
+    if unparseable.any():
+      report.add('error', name, 'money', 'values are not amounts of money', column=col, count=unparseable.sum(), sample=raw[unparseable])
+
+    negative = parsed < 0
+    if negative.any():
+      report.add('error', name, 'money', 'negative amounts', column=col, count=negative.sum(), sample=raw[negative])
+
+def check_counts(report, name, frame):
+  for col in COUNT_COLUMNS.get(name, []):
+    if col not in frame.columns:
+      continue
+    values = pd.to_numeric(frame[col], errors='coerce')
+    bad = (frame[col].notna() & values.isna()) | (values < 0) | (values.notna() & (values % 1 != 0))
+    if bad.any():
+      report.add('error', name, 'counts', 'values are not whole, non-negative counts', column=col, count=bad.sum(), sample=frame[col][bad])
+
+def check_years(report, name, frame):
+  for col in YEAR_COLUMNS.get(name, []):
+    values = pd.to_numeric(frame[col], errors='coerce')
+    bad = (frame[col].notna() & values.isna()) | (values.notna() & (values % 1 != 0)) | (values < 1900) | (values > 2100)
+    if bad.any():
+      report.add('warning', name, 'domain', 'values are not plausible years', column=col, count=bad.sum(), sample=frame[col][bad])
+
+  if name == 'awards':
+    months = frame['Month Awarded']
+    bad = months.notna() & ~months.isin(MONTHS)
+    if bad.any():
+      report.add('warning', name, 'domain', 'values are not month names', column='Month Awarded', count=bad.sum(), sample=months[bad].unique())
+
+# spellings of one category that only differ in case or spacing, e.g.
+# 'Water Technology and innovation' / 'Water Technology and Innovation'
+# works on the distinct values, not on the rows
+def check_spellings(report, name, frame):
+  for col in CATEGORY_COLUMNS.get(name, []):
+    if col not in frame.columns:
+      continue
+    # astype('string'): an empty column is read as float
+    values = pd.Series(frame[col].dropna().unique()).astype('string')
+    normalized = values.str.lower().str.split().str.join(' ')
+    variants = values.groupby(normalized).agg(list)
+    variants = variants[variants.str.len() > 1]
+    if len(variants) == 0:
+      continue
+
+    # the focus categories are upper-cased when loaded, so their variants merge on their own
+    severity = 'info' if col in FOCUS_COLUMNS else 'warning'
+    for spellings in variants:
+      report.add(severity, name, 'spelling', f'{len(spellings)} spellings of the same value', column=col, count=len(spellings), sample=spellings)
+
+  if name == 'projects':
+    for col in FOCUS_COLUMNS:
+      lower = frame[col].notna() & (frame[col].astype('string') != frame[col].astype('string').str.upper())
+      if lower.any():
+        report.add('info', name, 'spelling', 'values not in upper case (upper-cased when loaded)', column=col, count=lower.sum(), sample=frame[col][lower].unique())
+
+# category values that aren't text, e.g. a focus category entered as a number (turned into text when loaded)
+# works on the distinct values, not on the rows
+def check_category_types(report, name, frame):
+  for col in CATEGORY_COLUMNS.get(name, []):
+    if col not in frame.columns:
+      continue
+    values = pd.Series(frame[col].dropna().unique(), dtype=object)
+    non_text = values[~values.map(lambda v: isinstance(v, str)).astype(bool)]
+    if len(non_text):
+      report.add('warning', name, 'domain', 'values are not text', column=col, count=frame[col].isin(non_text).sum(), sample=non_text)
+
+def check_sheet_ids(report, name, frame):
+  ids = pd.to_numeric(frame['Sheet ID'], errors='coerce')
+  if name == 'projects':
+    fractional = ids % 1 != 0
+    if fractional.any():
+      report.add('warning', name, 'identity', 'fractional Sheet IDs on projects', column='Sheet ID', count=fractional.sum(), sample=frame['Sheet ID'][fractional])
+
+  # Sheet IDs are only unique within the workbook they come from
+  keys = ids.to_frame().assign(source=frame[SOURCE_COLUMN]) if SOURCE_COLUMN in frame.columns else ids
+  duplicated = keys.duplicated(keep=False) & ids.notna()
+  if duplicated.any():
+    report.add('warning', name, 'identity', 'duplicate Sheet IDs', column='Sheet ID', count=duplicated.sum(), sample=frame['Sheet ID'][duplicated].unique())
+
+# products / awards are numbered after their project, e.g. products 4.0, 4.1 and 4.2 of project 4,
+# so the whole part of their Sheet ID must be the Sheet ID of a project (of the same workbook)
+def check_sheet_id_parents(report, proj_data, frames):
+  def keys(frame, ids):
+    return ids.to_frame().assign(source=frame[SOURCE_COLUMN]) if SOURCE_COLUMN in frame.columns else ids.to_frame()
+
+  projects = pd.MultiIndex.from_frame(keys(proj_data, pd.to_numeric(proj_data['Sheet ID'], errors='coerce')))
+  for name in ('products', 'awards'):
+    frame = frames[name]
+    ids = pd.to_numeric(frame['Sheet ID'], errors='coerce')
+    parents = pd.MultiIndex.from_frame(keys(frame, ids // 1))
+    orphans = ids.notna() & ~parents.isin(projects)
+    if orphans.any():
+      report.add('warning', name, 'identity', 'Sheet IDs whose whole part is not the Sheet ID of a project', column='Sheet ID', count=orphans.sum(), sample=frame['Sheet ID'][orphans].unique())
+
+def check_project_ids(report, proj_data, frames):
+  ids = proj_data['Project ID']
+  duplicated = ids.duplicated(keep=False) & ids.notna()
+  if duplicated.any():
+    report.add('warning', 'projects', 'identity', 'duplicate Project IDs', column='Project ID', count=duplicated.sum(), sample=ids[duplicated].unique())
+
+  missing = ids.isna()
+  if missing.any():
+    report.add('error', 'projects', 'identity', 'projects without a Project ID', column='Project ID', count=missing.sum())
+
+  # products / awards pointing to a project that isn't in the projects sheet
+  for name in ('products', 'awards'):
+    frame = frames[name]
+    orphans = frame['Project ID'].notna() & ~frame['Project ID'].isin(ids)
+    if orphans.any():
+      report.add('warning', name, 'orphans', 'rows whose Project ID is not in projects', column='Project ID', count=orphans.sum(), sample=frame['Project ID'][orphans].unique())
+
+# projects silently dropped from the figures by a hardcoded list
+def check_exclusions(report, proj_data, excluded_institutions):
+  excluded = proj_data['PI Affiliated Organization'].isin(excluded_institutions)
+  if excluded.any():
+    amounts = pd.to_numeric(proj_data['Funding Amount'].astype('string').str.replace(r'[$,\s]', '', regex=True), errors='coerce')
+    report.add('info', 'projects', 'exclusions', f'projects left out of the institution figures (${amounts[excluded].sum():,.0f} of funding)', column='PI Affiliated Organization', count=excluded.sum(), sample=proj_data['PI Affiliated Organization'][excluded].unique())
+
+  stale = sorted(set(excluded_institutions) - set(proj_data['PI Affiliated Organization'].dropna().unique()))
+  if stale:
+    report.add('info', 'projects', 'exclusions', 'excluded institutions that are not in the data', column='PI Affiliated Organization', count=len(stale), sample=stale)
+
+# product stages that look like ones the cleaning drops but are spelled differently, e.g. 'submitted/inReview'
+def check_product_stages(report, prod_data, excluded_stages):
+  stages = pd.Series(prod_data['Product Stage'].dropna().unique()).astype('string')
+  pattern = '|'.join(excluded_stages)
+  near = stages[stages.str.contains(pattern, case=False, regex=True) & ~stages.isin(excluded_stages)]
+  if len(near):
+    report.add('warning', 'products', 'domain', f'stages similar to the excluded {excluded_stages} are kept', column='Product Stage', count=prod_data['Product Stage'].isin(near).sum(), sample=near)
+
+
+# run every check on the raw frames and return the ValidationReport
+def validate(proj_data, prod_data, award_data, excluded_institutions=(), excluded_stages=()):
+  report = ValidationReport()
+  frames = {'projects': proj_data, 'products': prod_data, 'awards': award_data}
+
+  schema_ok = {name: check_schema(report, name, frame) for name, frame in frames.items()}
+  # the other checks need the required columns
+  if not all(schema_ok.values()):
+    return report
+
+  for name, frame in frames.items():
+    check_money(report, name, frame)
+    check_counts(report, name, frame)
+    check_years(report, name, frame)
+    check_spellings(report, name, frame)
+    check_category_types(report, name, frame)
+    check_sheet_ids(report, name, frame)
+
+  check_project_ids(report, proj_data, frames)
+  check_sheet_id_parents(report, proj_data, frames)
+  if len(excluded_institutions):
+    check_exclusions(report, proj_data, excluded_institutions)
+  if len(excluded_stages):
+    check_product_stages(report, prod_data, excluded_stages)
+
+  return report
+
+
+def main():
+  import datavis
+
+  parser = argparse.ArgumentParser(description='Validate the projects, products and awards data.')
+  parser.add_argument('--data-dir', default=datavis.DATA_DIR)
+  parser.add_argument('--json', action='store_true', help='print the report as JSON')
+  parser.add_argument('--strict', action='store_true', help='fail on warnings too')
+  args = parser.parse_args()
+
+  report = validate(*datavis.read_data(args.data_dir), datavis.EXCLUDED_INSTITUTIONS, datavis.EXCLUDED_STAGES)
+  print(json.dumps(report.to_dict(), indent=2) if args.json else report.format())
+
+  failed = report.errors or (args.strict and report.warnings)
+  sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+  main()